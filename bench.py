@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import time
+import numpy as np
+from nn import NeuralNetwork
+import creatures
+import simulation
+from terrain import random_terrain
+from parameters import *
+
+
+
+def random_genomes(morpho, n, activation=ACTIVATION):
+    c = getattr(creatures, morpho)(None)
+    layers = [c.n_inputs] + HIDDEN_LAYERS + [c.n_contact_sensors]
+    genomes = []
+    for i in range(n):
+        nn = NeuralNetwork()
+        nn.init_weights(layers)
+        nn.set_activation(activation)
+        genomes.append((morpho, nn))
+    return genomes
+
+
+
+def bench_feedforward(args):
+    """ Number of NeuralNetwork.feedforward calls per second """
+    morpho, nn = random_genomes(args.morpho, 1, args.activation)[0]
+    layers = nn.get_layers()
+    inputs = [list(np.random.uniform(-1, 1, layers[0])) for i in range(100)]
+
+    print(f"Layers {layers}, activation {args.activation}")
+    best = 0
+    for r in range(args.repeat):
+        t0 = time.perf_counter()
+        for i in range(args.calls):
+            nn.feedforward(inputs[i%100])
+        calls_per_sec = args.calls / (time.perf_counter()-t0)
+        best = max(best, calls_per_sec)
+    print(f"  feedforward: {best:.0f} calls/s (best of {args.repeat})")
+
+
+
+def bench_ground(args):
+    """ Building the ground and stepping a world, with edges or a chain shape """
+    terrain = random_terrain(args.terrain_roughness, seed=0)
+    genomes = random_genomes(args.morpho, args.creatures)
+    evaluator = simulation.Evaluator()
+    print(f"{args.creatures} {args.morpho} on {len(terrain.vertices)-1} meters of ground")
+    for chain in (False, True):
+        name = "chain" if chain else "edges"
+        t0 = time.perf_counter()
+        for i in range(100):
+            w = simulation.world(gravity=(0, -10))
+            terrain.build(w, chain)
+        build_time = (time.perf_counter()-t0) / 100
+        
+        best = 0
+        for r in range(args.repeat):
+            w = simulation.world(contactListener=evaluator.contact_listener,
+                                 gravity=(0, -10), doSleep=True)
+            terrain.build(w, chain)
+            group = [evaluator.spawn(g, w, terrain) for g in genomes]
+            for i, c in enumerate(group):
+                c.set_category(i+1)
+                c.joints[0].motorSpeed = 1.0   # Keep bodies awake
+            t0 = time.perf_counter()
+            for i in range(args.steps):
+                w.Step(simulation.TIME_STEP, 6, 2)
+            best = max(best, args.steps / (time.perf_counter()-t0))
+            for c in group:
+                c.destroy()
+        print(f"  {name}: build {build_time*1000:.3f} ms, world.Step {best:.0f} steps/s (best of {args.repeat})")
+
+
+
+def bench_control(args):
+    """ Control steps per second: sensor readout, feedforward and actuation """
+    terrain = random_terrain(args.terrain_roughness, seed=0)
+    genomes = random_genomes(args.morpho, args.creatures)
+    evaluator = simulation.Evaluator()
+    w = evaluator.new_world(terrain)
+    group = [evaluator.spawn(g, w, terrain) for g in genomes]
+    for i in range(60):
+        w.Step(simulation.TIME_STEP, 6, 2)
+    print(f"{args.creatures} {args.morpho}")
+    for mirror in (False, True):
+        name = "mirror" if mirror else "normal"
+        updater = simulation.CreatureGroup(group)
+        best = 0
+        for r in range(args.repeat):
+            t0 = time.perf_counter()
+            for i in range(args.calls):
+                updater.update(evaluator.contact_listener.sensors, mirror)
+            best = max(best, args.calls*len(group) / (time.perf_counter()-t0))
+        print(f"  {name}: {best:.0f} creature updates/s (best of {args.repeat})")
+
+
+
+def bench_trials(args):
+    """ Full trials per second, building new bodies for every trial or reusing them """
+    terrain = random_terrain(args.terrain_roughness, seed=0)
+    genomes = random_genomes(args.morpho, args.trials)
+    print(f"{args.trials} trials of {args.morpho}, {args.steps} steps, batches of {args.batch}")
+    for pooled in (False, True):
+        name = "pooled" if pooled else "new bodies"
+        best = 0
+        for r in range(args.repeat):
+            evaluator = simulation.Evaluator(pooled)
+            t0 = time.perf_counter()
+            for i in range(0, len(genomes), args.batch):
+                evaluator.run_trials(genomes[i:i+args.batch], terrain, args.steps)
+            best = max(best, len(genomes) / (time.perf_counter()-t0))
+        print(f"  {name}: {best:.1f} trials/s (best of {args.repeat})")
+
+
+
+def ranks(values):
+    """ Rank of every value, 0 for the lowest """
+    r = np.empty(len(values))
+    r[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return r
+
+
+
+def bench_physics(args):
+    """ Simulation speed and rank order of a fixed population under every physics profile
+
+        Scores are averaged over a few terrains and compared to the ones
+        obtained with the reference profile: Spearman correlation of the
+        ranks, and share of the reference's top individuals found among
+        each profile's top individuals
+    """
+    terrains = [random_terrain(args.terrain_roughness, seed=s) for s in range(args.terrains)]
+    if args.file:
+        from utils import import_generation
+        population = import_generation(args.file, None)["population"]
+        genomes = [c.get_genome() for c in population]
+    else:
+        genomes = random_genomes(args.morpho, args.population)
+    top = max(1, len(genomes) * args.top // 100)
+    print(f"{len(genomes)} {genomes[0][0]}, {len(terrains)} terrains, {args.steps} steps, "
+          f"batches of {args.batch}, top {top} compared to \"{args.reference}\"")
+    
+    results = dict()
+    for name, profile in simulation.PHYSICS.items():
+        evaluator = simulation.Evaluator(physics=name)
+        scores = np.zeros(len(genomes))
+        steps = 0
+        t0 = time.perf_counter()
+        for terrain in terrains:
+            for i in range(0, len(genomes), args.batch):
+                trials = evaluator.run_trials(genomes[i:i+args.batch], terrain, args.steps)
+                scores[i:i+len(trials)] += [t.score for t in trials]
+                steps += sum([t.steps for t in trials])
+        results[name] = (scores / len(terrains), steps / (time.perf_counter()-t0))
+    
+    reference = results[args.reference][0]
+    ref_ranks = ranks(reference)
+    ref_top = set(np.argsort(reference, kind="stable")[:top])
+    for name, (scores, speed) in results.items():
+        profile = simulation.PHYSICS[name]
+        rho = np.corrcoef(ranks(scores), ref_ranks)[0, 1]
+        overlap = len(ref_top & set(np.argsort(scores, kind="stable")[:top])) / top
+        print(f"  {name:>8}: {round(1/profile.time_step)} Hz x{profile.substeps}, "
+              f"iterations {profile.velocity_iterations}/{profile.position_iterations}, "
+              f"{speed:.0f} steps/s, rank correlation {rho:.3f}, top {overlap:.0%}")
+
+
+
+def bench_novelty(args):
+    """ Novelty scores of a generation against archives of growing sizes,
+        with the k-d trees of novelty.NoveltyArchive or scanning the whole
+        archive
+
+        Behaviours are random walks of a body on a plane, sampled like the
+        trajectories of evolve.py --novelty
+    """
+    from novelty import NoveltyArchive
+    rng = np.random.default_rng(0)
+    def trajectories(n):
+        return np.cumsum(rng.normal(size=(n, args.samples, 2)) * (1.0, 0.2), axis=1).reshape(n, -1)
+    generation = trajectories(args.generation)
+    print(f"Generations of {args.generation} behaviours of {args.samples} positions, k={args.k}")
+    for size in args.sizes:
+        archive = NoveltyArchive(size, args.k)
+        t0 = time.perf_counter()
+        for i in range(0, size, args.generation):
+            archive.add(trajectories(min(args.generation, size-i)))
+        build_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        novelty = archive.novelty(generation)
+        tree_time = time.perf_counter() - t0
+        
+        t0 = time.perf_counter()
+        points = np.vstack([tree.points for tree in archive.trees] + archive.pending)
+        scanned = np.empty(len(generation))
+        for i, b in enumerate(generation):
+            d2 = np.concatenate([np.einsum('ij,ij->i', points-b, points-b),
+                                 np.einsum('ij,ij->i', generation-b, generation-b)])
+            # The behaviour itself is at distance 0
+            scanned[i] = np.mean(np.sqrt(np.partition(d2, args.k)[1:args.k+1]))
+        scan_time = time.perf_counter() - t0
+        assert np.allclose(novelty, scanned)
+        print(f"  {len(archive):>7} archived: {len(archive.trees)} trees, {tree_time*1000:.1f} ms, "
+              f"full scan {scan_time*1000:.1f} ms (archive filled in {build_time:.2f}s)")
+
+
+
+def parseInputs():
+    parser = argparse.ArgumentParser(description='Neuranim microbenchmarks')
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    p = subparsers.add_parser('feedforward', help='neural network evaluation')
+    p.add_argument('-m', '--morpho', type=str, default=ANIMATRONIC, help=f'creature morphology (defaults to {ANIMATRONIC})')
+    p.add_argument('-a', '--activation', type=str, default=ACTIVATION, help=f'activation function (defaults to {ACTIVATION})')
+    p.add_argument('-n', '--calls', type=int, default=100000, help='number of calls per run (defaults to 100000)')
+    p.add_argument('-r', '--repeat', type=int, default=5, help='number of runs (defaults to 5)')
+    p.set_defaults(func=bench_feedforward)
+
+    p = subparsers.add_parser('ground', help='ground made of edges or of a chain shape')
+    p.add_argument('-m', '--morpho', type=str, default=ANIMATRONIC, help=f'creature morphology (defaults to {ANIMATRONIC})')
+    p.add_argument('-c', '--creatures', type=int, default=10, help='number of creatures in the world (defaults to 10)')
+    p.add_argument('-t', '--terrain_roughness', type=int, default=30, help='terrain variation in elevation (in percent)')
+    p.add_argument('-l', '--steps', type=int, default=1000, help='number of steps per run (defaults to 1000)')
+    p.add_argument('-r', '--repeat', type=int, default=5, help='number of runs (defaults to 5)')
+    p.set_defaults(func=bench_ground)
+
+    p = subparsers.add_parser('control', help='sensor readout, feedforward and actuation')
+    p.add_argument('-m', '--morpho', type=str, default=ANIMATRONIC, help=f'creature morphology (defaults to {ANIMATRONIC})')
+    p.add_argument('-c', '--creatures', type=int, default=1, help='number of creatures updated together (defaults to 1)')
+    p.add_argument('-t', '--terrain_roughness', type=int, default=30, help='terrain variation in elevation (in percent)')
+    p.add_argument('-n', '--calls', type=int, default=20000, help='number of updates per run (defaults to 20000)')
+    p.add_argument('-r', '--repeat', type=int, default=5, help='number of runs (defaults to 5)')
+    p.set_defaults(func=bench_control)
+
+    p = subparsers.add_parser('trials', help='whole trials, with new or pooled bodies')
+    p.add_argument('-m', '--morpho', type=str, default=ANIMATRONIC, help=f'creature morphology (defaults to {ANIMATRONIC})')
+    p.add_argument('-n', '--trials', type=int, default=200, help='number of trials per run (defaults to 200)')
+    p.add_argument('-b', '--batch', type=int, default=1, help='number of creatures simulated together in the same world (defaults to 1)')
+    p.add_argument('-t', '--terrain_roughness', type=int, default=30, help='terrain variation in elevation (in percent)')
+    p.add_argument('-l', '--steps', type=int, default=100, help='max number of steps per trial (defaults to 100)')
+    p.add_argument('-r', '--repeat', type=int, default=5, help='number of runs (defaults to 5)')
+    p.set_defaults(func=bench_trials)
+
+    p = subparsers.add_parser('physics', help='speed and rank stability of a population under every physics profile')
+    p.add_argument('-m', '--morpho', type=str, default=ANIMATRONIC, help=f'creature morphology of the random population (defaults to {ANIMATRONIC})')
+    p.add_argument('-f', '--file', type=str, help='population file, instead of a random population')
+    p.add_argument('-n', '--population', type=int, default=100, help='size of the random population (defaults to 100)')
+    p.add_argument('-b', '--batch', type=int, default=1, help='number of creatures simulated together in the same world (defaults to 1)')
+    p.add_argument('-t', '--terrain_roughness', type=int, default=30, help='terrain variation in elevation (in percent)')
+    p.add_argument('--terrains', type=int, default=3, help='number of terrains every individual is scored on (defaults to 3)')
+    p.add_argument('-l', '--steps', type=int, default=500, help='max number of steps per trial (defaults to 500)')
+    p.add_argument('--reference', choices=list(simulation.PHYSICS), default='precise', help='profile the others are compared to (defaults to precise)')
+    p.add_argument('--top', type=int, default=10, help='percent of best individuals compared (defaults to 10)')
+    p.set_defaults(func=bench_physics)
+
+    p = subparsers.add_parser('novelty', help='novelty scores with a k-d tree archive or a full scan')
+    p.add_argument('-s', '--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='archive sizes (defaults to 1000 10000 100000)')
+    p.add_argument('-n', '--generation', type=int, default=200, help='number of behaviours scored at once (defaults to 200)')
+    p.add_argument('--samples', type=int, default=5, help='positions per behaviour (defaults to 5)')
+    p.add_argument('-k', type=int, default=15, help='number of nearest neighbours (defaults to 15)')
+    p.set_defaults(func=bench_novelty)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parseInputs()
+    args.func(args)
@@ -2,23 +2,144 @@
 # -*- coding: utf-8 -*-
 
 
-from Box2D.b2 import pi, vec2, world, circleShape, polygonShape, staticBody, dynamicBody, fixtureDef
+from Box2D.b2 import pi, vec2, world, circleShape, polygonShape, staticBody, dynamicBody, fixtureDef, bodyDef, revoluteJointDef
 import numpy as np
 import uuid
 from parameters import *
 from nn import *
+from morphologies import MORPHOLOGIES
+
+
+
+class Definitions:
+    """ Box2D definitions of a morphology's bodies, fixtures and joints,
+        built once from its spec (see morphologies.py)
+    """
+    
+    def __init__(self, spec):
+        self.body_def = bodyDef(type=dynamicBody)
+        self.body_names = []
+        # (body index, fixtureDef, sensor column), the column of the fixture
+        # in the contact listener (see nnContactListener.get_tag)
+        self.fixtures = []
+        for body_name, fixture in spec["fixtures"]:
+            if body_name not in self.body_names:
+                self.body_names.append(body_name)
+            props = dict(fixture)
+            sensor = props.pop("sensor", None)
+            if "box" in props:
+                shape = polygonShape(box=props.pop("box"))
+            else:
+                shape = circleShape(radius=props.pop("radius"), pos=props.pop("pos", (0, 0)))
+            self.fixtures.append((self.body_names.index(body_name),
+                                  fixtureDef(shape=shape, **props),
+                                  sensor))
+        self.n_contact_sensors = sum([sensor is not None for _, _, sensor in self.fixtures])
+        # The first fixture of the main body tells when the body touches
+        # the ground, unless it is a contact sensor
+        body_index, fixture_def, sensor = self.fixtures[0]
+        if sensor is None:
+            self.fixtures[0] = (body_index, fixture_def, -1)
+        
+        self.joints = []        # (revoluteJointDef, body A index, body B index)
+        for body_a, body_b, anchor_a, anchor_b, torque in spec["joints"]:
+            joint_def = revoluteJointDef(collideConnected = False,
+                                         localAnchorA = anchor_a,
+                                         localAnchorB = anchor_b,
+                                         referenceAngle = pi,
+                                         enableMotor = True,
+                                         motorSpeed = 0.0,
+                                         maxMotorTorque = torque)
+            self.joints.append((joint_def,
+                                self.body_names.index(body_a),
+                                self.body_names.index(body_b)))
+        self.n_inputs = 2 + len(self.joints) + self.n_contact_sensors + int(spec["body_angle"])
+        
+        # Neural network inputs, from raw sensor values:
+        #     [dpos.x] [dpos.y] [joint angles mod 2*pi] [contact sensors] [body angle]
+        # Values are divided by input_divisors and input_offsets are added.
+        # This maps joint angles to [-1, 1], with right joints negated so
+        # both sides of the body look the same to the network.
+        n_joints = len(self.joints)
+        joints = np.arange(2, 2+n_joints)
+        contacts = np.arange(2+n_joints, 2+n_joints+self.n_contact_sensors)
+        others = np.arange(2+n_joints+self.n_contact_sensors, self.n_inputs)
+        joint_signs = np.ones(n_joints)
+        joint_signs[n_joints//2 + n_joints%2:] = -1
+        self.input_divisors = np.ones(self.n_inputs)
+        self.input_divisors[joints] = joint_signs*pi
+        self.input_offsets = np.zeros(self.n_inputs)
+        self.input_offsets[joints] = -joint_signs
+        # Mirror mode swaps left and right: the mirrored input i is input
+        # input_order[i] times input_signs[i] (only dpos.x is negated),
+        # the mirrored output i is output output_order[i]. The neural
+        # network folds this in its weights (see NeuralNetwork.get_mirror_weights)
+        input_order = np.concatenate(([0, 1], joints[::-1], contacts[::-1], others))
+        input_signs = np.ones(self.n_inputs)
+        input_signs[0] = -1
+        output_order = np.arange(n_joints)[::-1]
+        self.mirror = (input_order, input_signs, output_order)
+        # Motor speeds are network outputs multiplied by the morphology's
+        # gains, in normal (row 0) and mirror mode (row 1)
+        self.output_gains = np.array([spec["gains"], spec["mirror_gains"]], dtype=float)
+    
+    def network_inputs(self, values):
+        """ Turn raw sensor values into neural network inputs, in place
+            
+            Args:
+                values: raw sensor values, one row per creature or a single one
+        """
+        values /= self.input_divisors
+        values += self.input_offsets
+    
+    def motor_speeds(self, output, mode):
+        """ Returns the motor speeds from a neural network output layer
+            
+            Args:
+                mode: 0 for normal mode, 1 for mirror mode
+        """
+        return output * self.output_gains[mode]
+    
+    def motor_speeds_batch(self, outputs, modes):
+        """ Same as motor_speeds for several creatures, one row each
+            
+            Args:
+                modes: list of modes, one per row
+        """
+        if modes.count(modes[0]) == len(modes):
+            return outputs * self.output_gains[modes[0]]
+        return outputs * self.output_gains[modes]
+
+
+# Definitions of every morphology, built on first use
+_definitions = dict()
+
+
+def get_definitions(morpho):
+    definitions = _definitions.get(morpho)
+    if definitions is None:
+        definitions = _definitions[morpho] = Definitions(MORPHOLOGIES[morpho])
+    return definitions
 
 
 
 class Animatronic(object):
-    """ Abstract class
+    """ A creature built from a morphology spec (see morphologies.py)
+        Subclasses only give the name of their morphology
     """
+    morpho = None
     
     def __init__(self, world):
         self.id = uuid.uuid1().fields[0]
         self.world = world
         self.score = 0
-        self.sensors = []
+        self.mirrored = False
+        self.definitions = get_definitions(self.morpho)
+        self.n_contact_sensors = self.definitions.n_contact_sensors
+        self.n_inputs = self.definitions.n_inputs
+        self.has_body_angle = MORPHOLOGIES[self.morpho]["body_angle"]
+        # Neural network inputs (see Definitions)
+        self.sensors = np.zeros(self.n_inputs)
     
     def set_start_position(self, x, y):
         self.start_position = vec2(x, y)
@@ -26,17 +147,12 @@ class Animatronic(object):
     def set_target(self, x, y):
         self.target = vec2(x, y)
     
-    """def breed(self, other):
-        nn = NeuralNetwork(NEURON_LAYERS)
-        nn.weights = []
-        for w1, w2 in zip(self.nn.weights, other.nn.weights):
-            nn.weights.append(cross2(w1, w2))
-        
-        child = Animatronic(self.world, self.position)
-        child.nn = nn
-        child.mutate()
+    def breed(self, other, genes=False, rng=None):
+        """ Returns a child of this creature and another one of the same morphology """
+        child = self.__class__(self.world)
+        child.nn = self.nn.crossover(other.nn, genes, rng)
+        child.pop_id = self.pop_id
         return child
-    """
     
     def get_position(self):
         pos = self.body.position
@@ -46,10 +162,17 @@ class Animatronic(object):
         cat = 2**n
         for body in self.bodies:
             for fix in body.fixtures:
-                fix.filterData.categoryBits = cat
-                fix.filterData.maskBits = 1
-                if fix.filterData.groupIndex == 0:
-                    fix.filterData.groupIndex = cat # This causes problems when creature's limbs collide with body
+                # Assigned back to the fixture so Box2D refilters its contacts
+                filter_data = fix.filterData
+                filter_data.categoryBits = cat
+                filter_data.maskBits = 1
+                if filter_data.groupIndex == 0:
+                    filter_data.groupIndex = cat # This causes problems when creature's limbs collide with body
+                fix.filterData = filter_data
+    
+    def get_genome(self):
+        """ Everything needed to rebuild this creature in another world """
+        return self.morpho, self.nn
     
     def copy(self):
         duplicate = self.__class__(self.world)
@@ -57,28 +180,181 @@ class Animatronic(object):
         duplicate.pop_id = self.pop_id
         return duplicate
     
-    def mutate(self, frequency=2):
-        total_synapses = self.nn.get_total_synapses()
-        mutation_count = 0
-        for w in self.nn.weights:
-            wf = w.flat
-            for i in range(w.size):
-                if np.random.randint(total_synapses//frequency) == 0:
-                    mutation_count += 1
-                    # Another random weight between -1 and 1
-                    r = np.random.random()*2 - 1.0
-                    # Deactivate synapse if close enough to 0
-                    if abs(r) < 0.02: r = 0
-                    # Keep deactivated
-                    if wf[i] != 0: wf[i] = r
-        return mutation_count
+    def mutate(self, frequency=2, rng=None):
+        """ Returns the number of mutations (see mutate_batch) """
+        return mutate_batch([self], frequency, rng)
+    
+    def init_body(self):
+        """ Build the bodies, fixtures and joints at the starting position """
+        defs = self.definitions
+        listener = self.world.contactListener
+        self.sensor_row = listener.registerSensors(self)
+        self.bodies = []
+        for body_index, fixture_def, column in defs.fixtures:
+            if body_index == len(self.bodies):
+                defs.body_def.position = self.start_position
+                self.bodies.append(self.world.CreateBody(defs.body_def))
+            fixture_def.userData = listener.get_tag(self.sensor_row, column)
+            self.bodies[body_index].CreateFixture(fixture_def)
+            fixture_def.userData = None
+        for name, body in zip(defs.body_names, self.bodies):
+            setattr(self, name, body)
+        self.create_joints()
+    
+    def create_joints(self):
+        self.joints = []
+        for joint_def, body_a, body_b in self.definitions.joints:
+            joint_def.bodyA = self.bodies[body_a]
+            joint_def.bodyB = self.bodies[body_b]
+            self.joints.append(self.world.CreateJoint(joint_def))
+    
+    def contact_sensors(self):
+        """ Contact sensors values, a view on the contact listener's array """
+        return self.world.contactListener.sensors[self.sensor_row, :self.n_contact_sensors]
+    
+    def touching_ground(self):
+        """ True if the body touches the ground """
+        return self.world.contactListener.sensors[self.sensor_row, -1] != 0
+    
+    def sense(self, sensors, mirror=False):
+        """ Returns the raw sensor values (see Definitions) and sets the
+            mirror mode for this step
+            
+            Args:
+                sensors: contact sensors values (body touching ground excluded)
+                mirror: inverse the symmetry of receptors
+        """
+        dpos = self.target - self.body.position
+        if dpos.length > 1:                          # Radius of sight
+            dpos.Normalize()
+        self.mirrored = dpos.x < 0 or mirror
+        values = [dpos.x, dpos.y]
+        values.extend([j.angle % (2*pi) for j in self.joints])
+        values.extend(sensors)
+        if self.has_body_angle:
+            # Body angle sensor, range [-180, 180] maps to [-1, 1]
+            values.append(((self.bodies[0].angle + pi) % (2 * pi) - pi) / pi)
+        return values
+    
+    def read_sensors(self, sensors, mirror=False):
+        """ Returns the neural network input layer (see sense)
+            
+            Inputs are never mirrored here, in mirror mode (self.mirrored)
+            they are meant for the mirror weights of the neural network
+        """
+        self.sensors[:] = self.sense(sensors, mirror)
+        self.definitions.network_inputs(self.sensors)
+        return self.sensors
+    
+    def actuate(self, output):
+        """ Set motor speeds from the neural network output layer """
+        speeds = self.definitions.motor_speeds(output, int(self.mirrored))
+        for joint, speed in zip(self.joints, speeds.tolist()):
+            joint.motorSpeed = speed
+    
+    def update(self, sensors, mirror=False):
+        """
+            Args:
+                sensors: contact sensors values (body touching ground excluded)
+                mirror: inverse the symmetry of receptors
+        """
+        inputs = self.read_sensors(sensors, mirror)
+        self.nn.feedforward(inputs, self.definitions.mirror if self.mirrored else None)
+        self.actuate(self.nn.output)
+    
+    def save_state(self):
+        """ Returns the position, angle and velocities of every body part """
+        return [(vec2(b.position), b.angle, vec2(b.linearVelocity), b.angularVelocity)
+                for b in self.bodies]
+    
+    def set_state(self, state):
+        """ Move the body parts to a state returned by save_state """
+        for body, (position, angle, velocity, angular_velocity) in zip(self.bodies, state):
+            body.active = True
+            body.transform = (position, angle)
+            body.linearVelocity = velocity
+            body.angularVelocity = angular_velocity
+            body.awake = True
+    
+    def reset(self, state):
+        """ Put the body parts back in a state returned by save_state,
+            with motors stopped and contact sensors cleared
+        """
+        self.set_state(state)
+        # Joints keep the impulses of their last step to warm start the solver,
+        # new ones start from zero
+        for joint in self.joints:
+            self.world.DestroyJoint(joint)
+        self.create_joints()
+        self.world.contactListener.clearSensors(self.sensor_row)
+        self.mirrored = False
+    
+    def deactivate(self):
+        """ Take the body out of the simulation, without destroying it """
+        # Box2D hands broadphase proxies back in reverse order, deactivating
+        # twice gives the bodies their original proxies when reactivated, so
+        # contacts are processed in the same order as in a new world
+        for active in (False, True, False):
+            for body in self.bodies:
+                body.active = active
     
     def destroy(self):
         for joint in self.joints:
             self.world.DestroyJoint(joint)
         for body in self.bodies:
             self.world.DestroyBody(body)
-        self.world.contactListener.unregisterSensors(self.id)
+        self.world.contactListener.unregisterSensors(self.sensor_row)
+
+
+
+
+def mutate_weights(weights, frequency=2, rng=None):
+    """
+        Mutate a batch of same-sized genomes in place
+        
+        Every synapse has a 1 in (total_synapses // frequency) chance to mutate,
+        so 'frequency' synapses mutate on average for each genome.
+        A mutation sets a new random weight between -1 and 1, or deactivates
+        the synapse (weight set to 0) if the new value is close enough to 0.
+        Deactivated synapses stay deactivated.
+        
+        Args:
+            weights: array of flattened genomes, one per row
+            frequency: mutation frequency multiplier
+            rng: numpy.random.Generator
+        
+        Returns the number of mutations of every genome
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    mask = rng.random(weights.shape) * (weights.shape[1]//frequency) < 1
+    values = rng.uniform(-1.0, 1.0, np.count_nonzero(mask))
+    # Deactivate synapse if close enough to 0
+    values[np.abs(values) < 0.02] = 0
+    # Keep deactivated
+    values[weights[mask] == 0] = 0
+    weights[mask] = values
+    return np.count_nonzero(mask, axis=1)
+
+
+
+def mutate_batch(creatures, frequency=2, rng=None):
+    """
+        Mutate the neural networks of several creatures at once
+        Returns the total number of mutations
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    mutation_count = 0
+    by_layers = dict()
+    for c in creatures:
+        by_layers.setdefault(tuple(c.nn.get_layers()), []).append(c.nn)
+    for networks in by_layers.values():
+        weights = np.stack([nn.get_flat_weights() for nn in networks])
+        mutation_count += mutate_weights(weights, frequency, rng).sum()
+        for nn, w in zip(networks, weights):
+            nn.set_flat_weights(w)
+    return int(mutation_count)
 
 
 
@@ -90,167 +366,11 @@ class Cubotron1000(Animatronic):
              
              Contact sensors:
                  - lfoot
-                 - lheel
                  - lbody
                  - rbody
-                 - rheel
                  - rfoot
-             Other sensors:
-                 - body_angle
     """
-    
-    def __init__(self, world):
-        super().__init__(world)
-        self.morpho = "Cubotron1000"
-        self.n_contact_sensors = 4
-        self.n_inputs = 2+4+4
-        
-    
-    def init_body(self):
-        """
-            Order of defining joints and sensors is important
-            self.joints must be symetrical so it can be reversed for mirror mode
-            
-            Sensors number (n):
-                      (0)-----x-----(1) [[[ BODY ]]] (2)-----x-----(3)
-            
-        """
-        
-        self.bodies = []
-        
-        self.body = self.world.CreateDynamicBody(position=self.start_position)
-        self.body.CreatePolygonFixture(box=(0.5, 0.5), density=1, friction=0.3,
-                                       userData = self,
-                                      )
-        # Ground/Body sensors
-        self.body.CreateCircleFixture(pos=(-0.5, 0.5), radius=0.15,
-                                      density=0,
-                                      isSensor=True, userData = (self.id, 1)
-                                     )
-        self.body.CreateCircleFixture(pos=(0.5, 0.5), radius=0.15,
-                                      density=0,
-                                      isSensor=True, userData = (self.id, 2)
-                                     )
-        self.bodies.append(self.body)
-        
-        # Legs
-        self.lleg = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.lleg.CreatePolygonFixture(box=(0.3, 0.15), density=1,
-                                                 friction=0.3,
-                                                 userData = self,
-                                                )
-        self.bodies.append(self.lleg)
-        
-        self.rleg = self.world.CreateDynamicBody(position=self.start_position)
-        self.rleg.CreatePolygonFixture(box=(0.3, 0.15), density=1, friction=0.3,
-                                       userData = self,
-                                      )
-        self.bodies.append(self.rleg)
-        
-        # Feet
-        self.lfoot = self.world.CreateDynamicBody(position=self.start_position)
-        self.lfoot.CreatePolygonFixture(box=(0.36, 0.08), density=1,
-                                        friction=0.3,
-                                        userData = self,
-                                       )
-        ## Ground/Foot sensor
-        self.lfoot.CreateCircleFixture(pos=(-0.36, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 0),
-                                      )
-        
-        self.rfoot = self.world.CreateDynamicBody(position=self.start_position)
-        self.rfoot.CreatePolygonFixture(box=(0.36, 0.08), density=1,
-                                        friction=0.3,
-                                        userData = self,
-                                       )
-        ## Ground/Foot sensor
-        self.rfoot.CreateCircleFixture(pos=(0.36, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 3),
-                                      )
-        self.bodies.append(self.lfoot)
-        self.bodies.append(self.rfoot)
-        
-        self.world.contactListener.registerSensors(self.id, self.n_contact_sensors)
-        
-        self.joints = []
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.lleg,
-                bodyB = self.lfoot,
-                collideConnected = False,
-                localAnchorA = (-0.3, 0),
-                localAnchorB = (0.36, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.body,
-                bodyB = self.lleg,
-                collideConnected = False,
-                localAnchorA = (-0.4, -0.45),
-                localAnchorB = (0.3, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 20.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.body,
-                bodyB = self.rleg,
-                collideConnected = False,
-                localAnchorA = (0.4, -0.45),
-                localAnchorB = (-0.3, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 20.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.rleg,
-                bodyB = self.rfoot,
-                collideConnected = False,
-                localAnchorA = (0.3, 0),
-                localAnchorB = (-0.36, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-    
-    
-    def update(self, sensors, mirror=False):
-        dpos = self.target - self.body.position
-        if dpos.length > 1:
-            dpos.Normalize()
-        joint_angles = [(j.angle%(2*pi))/pi - 1 for j in self.joints]
-        # Make the limbs angle list symmetric (second half *= -1)
-        for i in range(len(joint_angles)//2 + len(joint_angles)%2, len(joint_angles)):
-            joint_angles[i] *= -1
-        
-        self.sensors = [dpos.x, dpos.y] + joint_angles + sensors
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            joint_angles = joint_angles[::-1]
-            self.sensors = [-dpos.x, dpos.y] + joint_angles + sensors[::-1]
-        
-        self.nn.feedforward(self.sensors)
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            self.joints[0].motorSpeed = -self.nn.output[3]*20
-            self.joints[1].motorSpeed = -self.nn.output[2]*20
-            self.joints[2].motorSpeed = -self.nn.output[1]*20
-            self.joints[3].motorSpeed = -self.nn.output[0]*20
-        else:
-            for i in range(len(self.joints)):
-                self.joints[i].motorSpeed = self.nn.output[i]*20
-
+    morpho = "Cubotron1000"
 
 
 
@@ -258,41 +378,7 @@ class Cubotron1001(Cubotron1000):
     """
         Same as Cubotron1000 but with a body angle sensor
     """
-    
-    def __init__(self, world):
-        super().__init__(world)
-        self.morpho = "Cubotron1001"
-        self.n_inputs += 1
-    
-    
-    def update(self, sensors, mirror=False):
-        dpos = self.target - self.body.position
-        if dpos.length > 1:
-            dpos.Normalize()
-        joint_angles = [(j.angle%(2*pi))/pi - 1 for j in self.joints]
-        # Make the limbs angle list symmetric (second half *= -1)
-        for i in range(len(joint_angles)//2 + len(joint_angles)%2, len(joint_angles)):
-            joint_angles[i] *= -1
-        
-        # Add body angle sensor, range [-180, 180] maps to [-1, 1]
-        body_angle = ((self.bodies[0].angle + pi) % (2 * pi) - pi) / pi
-        
-        self.sensors = [dpos.x, dpos.y] + joint_angles + sensors + [body_angle]
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            joint_angles = joint_angles[::-1]
-            self.sensors = [-dpos.x, dpos.y] + joint_angles + sensors[::-1] + [body_angle]
-        
-        self.nn.feedforward(self.sensors)
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            self.joints[0].motorSpeed = -self.nn.output[3]*20
-            self.joints[1].motorSpeed = -self.nn.output[2]*20
-            self.joints[2].motorSpeed = -self.nn.output[1]*20
-            self.joints[3].motorSpeed = -self.nn.output[0]*20
-        else:
-            for i in range(len(self.joints)):
-                self.joints[i].motorSpeed = self.nn.output[i]*20
+    morpho = "Cubotron1001"
 
 
 
@@ -300,168 +386,7 @@ class Weakotron1001(Cubotron1001):
     """
         Same as Cubotron1001 but with super weak motors
     """
-    
-    def __init__(self, world):
-        super().__init__(world)
-        self.morpho = "Weakotron1001"
-    
-    
-    def init_body(self):
-        """
-            Order of defining joints and sensors is important
-            self.joints must be symetrical so it can be reversed for mirror mode
-            
-            Sensors number (n):
-                      (0)-----x-----(1) [[[ BODY ]]] (2)-----x-----(3)
-            
-        """
-        
-        self.bodies = []
-        
-        self.body = self.world.CreateDynamicBody(position=self.start_position)
-        self.body.CreatePolygonFixture(box=(0.5, 0.5), density=1, friction=0.3,
-                                       userData = self,
-                                       #groupIndex = -1
-                                      )
-        # Ground/Body sensors
-        self.body.CreateCircleFixture(pos=(-0.5, 0.5), radius=0.15,
-                                      density=0,
-                                      isSensor=True, userData = (self.id, 1)
-                                     )
-        self.body.CreateCircleFixture(pos=(0.5, 0.5), radius=0.15,
-                                      density=0,
-                                      isSensor=True, userData = (self.id, 2)
-                                     )
-        self.bodies.append(self.body)
-        
-        # Legs
-        self.lleg = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.lleg.CreatePolygonFixture(box=(0.3, 0.15), density=1,
-                                                 friction=0.3,
-                                                 userData = self,
-                                                 #groupIndex = -1
-                                                )
-        self.bodies.append(self.lleg)
-        
-        self.rleg = self.world.CreateDynamicBody(position=self.start_position)
-        self.rleg.CreatePolygonFixture(box=(0.3, 0.15), density=1, friction=0.3,
-                                       userData = self,
-                                       #groupIndex = -1
-                                      )
-        self.bodies.append(self.rleg)
-        
-        # Feet
-        self.lfoot = self.world.CreateDynamicBody(position=self.start_position)
-        self.lfoot.CreatePolygonFixture(box=(0.36, 0.08), density=1,
-                                        friction=0.3,
-                                        userData = self,
-                                        #groupIndex = -1
-                                       )
-        ## Ground/Foot sensor
-        self.lfoot.CreateCircleFixture(pos=(-0.36, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 0),
-                                       #groupIndex = -1
-                                      )
-        
-        self.rfoot = self.world.CreateDynamicBody(position=self.start_position)
-        self.rfoot.CreatePolygonFixture(box=(0.36, 0.08), density=1,
-                                        friction=0.3,
-                                        userData = self,
-                                        #groupIndex = -1
-                                       )
-        ## Ground/Foot sensor
-        self.rfoot.CreateCircleFixture(pos=(0.36, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 3),
-                                       #groupIndex = -1
-                                      )
-        self.bodies.append(self.lfoot)
-        self.bodies.append(self.rfoot)
-        
-        self.world.contactListener.registerSensors(self.id, self.n_contact_sensors)
-        
-        self.joints = []
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.lleg,
-                bodyB = self.lfoot,
-                collideConnected = False,
-                localAnchorA = (-0.3, 0),
-                localAnchorB = (0.36, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 5.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.body,
-                bodyB = self.lleg,
-                collideConnected = False,
-                localAnchorA = (-0.4, -0.45),
-                localAnchorB = (0.3, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.body,
-                bodyB = self.rleg,
-                collideConnected = False,
-                localAnchorA = (0.4, -0.45),
-                localAnchorB = (-0.3, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.rleg,
-                bodyB = self.rfoot,
-                collideConnected = False,
-                localAnchorA = (0.3, 0),
-                localAnchorB = (-0.36, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 5.0
-            ))
-    
-    
-    def update(self, sensors, mirror=False):
-        dpos = self.target - self.body.position
-        if dpos.length > 1:
-            dpos.Normalize()
-        joint_angles = [(j.angle%(2*pi))/pi - 1 for j in self.joints]
-        # Make the limbs angle list symmetric (second half *= -1)
-        for i in range(len(joint_angles)//2 + len(joint_angles)%2, len(joint_angles)):
-            joint_angles[i] *= -1
-        
-        # Add body angle sensor, range [-180, 180] maps to [-1, 1]
-        body_angle = ((self.bodies[0].angle + pi) % (2 * pi) - pi) / pi
-        
-        self.sensors = [dpos.x, dpos.y] + joint_angles + sensors + [body_angle]
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            joint_angles = joint_angles[::-1]
-            self.sensors = [-dpos.x, dpos.y] + joint_angles + sensors[::-1] + [body_angle]
-        
-        self.nn.feedforward(self.sensors)
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            self.joints[0].motorSpeed = -self.nn.output[3]*3
-            self.joints[1].motorSpeed = -self.nn.output[2]*3
-            self.joints[2].motorSpeed = -self.nn.output[1]*3
-            self.joints[3].motorSpeed = -self.nn.output[0]*3
-        else:
-            self.joints[0].motorSpeed = -self.nn.output[0]*3
-            self.joints[1].motorSpeed = -self.nn.output[1]*3
-            self.joints[2].motorSpeed = -self.nn.output[2]*3
-            self.joints[3].motorSpeed = -self.nn.output[3]*3
+    morpho = "Weakotron1001"
 
 
 
@@ -480,436 +405,20 @@ class Boulotron2000(Animatronic):
              Other sensors:
                  - body_angle
     """
-    
-    def __init__(self, world):
-        super().__init__(world)
-        self.morpho = "Boulotron2000"
-        self.n_contact_sensors = 6
-        self.n_inputs = 2+6+6+1
-    
-    
-    def init_body(self):
-        """
-            Order of defining joints and sensors is important
-            self.joints must be symetrical so it can be reversed for mirror mode
-            
-            Sensors number (n):
-                  (0)---X(1)-----x-----(2) [[[ BODY ]]] (3)-----x-----(4)X---(5)
-        """
-        
-        self.bodies = []
-        
-        self.body = self.world.CreateDynamicBody(position=self.start_position)
-        self.body.CreateCircleFixture(pos=(0.0, 0.0), radius=0.6, density=1.0,
-                                      userData = self,)
-                
-        ## Ground/Body sensors
-        self.body.CreateCircleFixture(pos=(-0.58, -0.1), radius=0.15,
-                                       density=0,
-                                       isSensor=True, userData = (self.id, 2))
-        self.body.CreateCircleFixture(pos=(0.58, -0.1), radius=0.15,
-                                       density=0,
-                                       isSensor=True, userData = (self.id, 3))
-        self.bodies.append(self.body)
-        
-        
-        # Thighs
-        self.lthigh = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.lthigh.CreatePolygonFixture(box=(0.3, 0.15), density=1, friction=0.3,
-                                                   userData = self,)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.lthigh)
-        
-        self.rthigh = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.rthigh.CreatePolygonFixture(box=(0.3, 0.15), density=1, friction=0.3)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.rthigh)
-        
-        
-        # Legs
-        self.lleg = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.lleg.CreatePolygonFixture(box=(0.36, 0.1), density=1, friction=0.3,
-                                                 userData = self,)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.lleg)
-        
-        self.rleg = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.rleg.CreatePolygonFixture(box=(0.36, 0.1), density=1, friction=0.3,
-                                                 userData = self,)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.rleg)
-        
-        
-        ## Heel sensors
-        self.lleg.CreateCircleFixture(pos=(-0.36, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 1), groupIndex=-1)
-        self.rleg.CreateCircleFixture(pos=(0.36, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 4), groupIndex=-1)        
-        
-        
-        # Feet
-        self.lfoot  = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.lfoot.CreatePolygonFixture(box=(0.2, 0.08), density=1, friction=0.3,
-                                                  userData = self,)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.lfoot)
-        
-        self.rfoot = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.rfoot.CreatePolygonFixture(box=(0.2, 0.08), density=1, friction=0.3,
-                                                  userData = self,)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.rfoot)
-        
-        
-        ## Feet sensors
-        self.lfoot.CreateCircleFixture(pos=(-0.2, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 0), groupIndex=-1)
-        self.rfoot.CreateCircleFixture(pos=(0.2, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 5), groupIndex=-1)
-        
-        # Contact sensors
-        self.world.contactListener.registerSensors(self.id, self.n_contact_sensors)
-        
-        self.joints = []
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.lleg,
-                bodyB = self.lfoot,
-                collideConnected = False,
-                localAnchorA = (-0.36, 0),
-                localAnchorB = (0.2, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.lthigh,
-                bodyB = self.lleg,
-                collideConnected = False,
-                localAnchorA = (-0.3, 0),
-                localAnchorB = (0.36, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.body,
-                bodyB = self.lthigh,
-                collideConnected = False,
-                localAnchorA = (0.0, -0.55),
-                localAnchorB = (0.3, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 20.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.body,
-                bodyB = self.rthigh,
-                collideConnected = False,
-                localAnchorA = (0.0, -0.55),
-                localAnchorB = (-0.3, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 20.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.rthigh,
-                bodyB = self.rleg,
-                collideConnected = False,
-                localAnchorA = (0.3, 0),
-                localAnchorB = (-0.36, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.rleg,
-                bodyB = self.rfoot,
-                collideConnected = False,
-                localAnchorA = (0.36, 0),
-                localAnchorB = (-0.2, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-    
-    
-    
-    def update(self, sensors, mirror=False):
-        dpos = self.target - self.body.position
-        if dpos.length > 1:                          # Radius of sight
-            dpos.Normalize()
-        joint_angles = [(j.angle % (2*pi)) / pi - 1 for j in self.joints]
-        # Make the limbs angle list symmetric (second half *= -1)
-        for i in range(len(joint_angles)//2 + len(joint_angles)%2, len(joint_angles)):
-            joint_angles[i] *= -1
-        
-        # Add body angle sensor, range [-180, 180] maps to [-1, 1]
-        body_angle = ((self.bodies[0].angle + pi) % (2 * pi) - pi) / pi
-        
-        self.sensors = [dpos.x, dpos.y] + joint_angles + sensors + [body_angle]
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            self.sensors = [-dpos.x, dpos.y] + joint_angles[::-1] + sensors[::-1] + [body_angle]
-        
-        # Send input to neural network
-        self.nn.feedforward(self.sensors)
-        
-        # Read output from neural network
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            self.joints[0].motorSpeed = -self.nn.output[5]*5.0
-            self.joints[1].motorSpeed = -self.nn.output[4]*15.0
-            self.joints[2].motorSpeed = -self.nn.output[3]*15.0
-            self.joints[3].motorSpeed = -self.nn.output[2]*15.0
-            self.joints[4].motorSpeed = -self.nn.output[1]*15.0
-            self.joints[5].motorSpeed = -self.nn.output[0]*5.0
-        else:
-            self.joints[0].motorSpeed = -self.nn.output[0]*5.0
-            self.joints[1].motorSpeed = -self.nn.output[1]*15.0
-            self.joints[2].motorSpeed = -self.nn.output[2]*15.0
-            self.joints[3].motorSpeed = -self.nn.output[3]*15.0
-            self.joints[4].motorSpeed = -self.nn.output[4]*15.0
-            self.joints[5].motorSpeed = -self.nn.output[5]*5.0
-
+    morpho = "Boulotron2000"
 
 
 
 class Boulotron2001(Animatronic):
     """"
-         Neural network input layer:
-             [pos.x] [pos.y] [joints × 6] [contact_sensors × 6] [body_angle]
-             
-             Contact sensors:
-                 - lfoot
-                 - lheel
-                 - lbody
-                 - rbody
-                 - rheel
-                 - rfoot
-             Other sensors:
-                 - body_angle
+         Same as Boulotron2000 with a lighter body, smaller feet and
+         weaker motors
     """
-    
-    def __init__(self, world):
-        self.morpho = "Boulotron2001"
-        self.n_contact_sensors = 6
-        self.n_inputs = 2+6+6+1
-        super().__init__(world)
-    
-    
-    def init_body(self):
-        """
-            Order of defining joints and sensors is important
-            self.joints must be symetrical so it can be reversed for mirror mode
-            
-            Sensors number (n):
-                  (0)---X(1)-----x-----(2) [[[ BODY ]]] (3)-----x-----(4)X---(5)
-        """
-        
-        self.bodies = []
-        
-        self.body = self.world.CreateDynamicBody(position=self.start_position)
-        self.body.CreateCircleFixture(pos=(0.0, 0.0), radius=0.6, density=0.5,
-                                      userData = self)
-        self.bodies.append(self.body)
-        
-        
-        ## Ground/Body sensors
-        self.body.CreateCircleFixture(pos=(-0.58, -0.1), radius=0.15,
-                                       density=0,
-                                       isSensor=True, userData = (self.id, 2))
-        self.body.CreateCircleFixture(pos=(0.58, -0.1), radius=0.15,
-                                       density=0,
-                                       isSensor=True, userData = (self.id, 3))
-        
-        
-        # Thighs
-        self.lthigh = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.lthigh.CreatePolygonFixture(box=(0.3, 0.15), density=1, friction=0.3,
-                                                 userData = self)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.lthigh)
-        
-        self.rthigh = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.rthigh.CreatePolygonFixture(box=(0.3, 0.15), density=1, friction=0.3)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.rthigh)
-        
-        
-        # Legs
-        self.lleg = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.lleg.CreatePolygonFixture(box=(0.36, 0.1), density=1, friction=0.3,
-                                                  userData = self)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.lleg)
-        
-        self.rleg = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.rleg.CreatePolygonFixture(box=(0.36, 0.1), density=1, friction=0.3,
-                                                  userData = self)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.rleg)
-        
-        
-        ## Heel sensors
-        self.lleg.CreateCircleFixture(pos=(-0.36, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 1), groupIndex=-1)
-        self.rleg.CreateCircleFixture(pos=(0.36, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 4), groupIndex=-1)        
-        
-        
-        # Feet
-        self.lfoot  = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.lfoot.CreatePolygonFixture(box=(0.1, 0.08), density=1, friction=0.3,
-                                                  userData = self)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.lfoot)
-        
-        self.rfoot = self.world.CreateDynamicBody(position=self.start_position)
-        fixture = self.rfoot.CreatePolygonFixture(box=(0.1, 0.08), density=1, friction=0.3,
-                                                  userData = self)
-        fixture.filterData.groupIndex = -1
-        self.bodies.append(self.rfoot)
-        
-        
-        ## Feet sensors
-        self.lfoot.CreateCircleFixture(pos=(-0.1, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 0), groupIndex=-1)
-        self.rfoot.CreateCircleFixture(pos=(0.1, 0), radius=0.15,
-                                       density=1, friction=1.0, restitution=0.0,
-                                       userData = (self.id, 5), groupIndex=-1)
-        
-        # Contact sensors
-        self.world.contactListener.registerSensors(self.id, self.n_contact_sensors)
-        
-        self.joints = []
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.lleg,
-                bodyB = self.lfoot,
-                collideConnected = False,
-                localAnchorA = (-0.36, 0),
-                localAnchorB = (0.2, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.lthigh,
-                bodyB = self.lleg,
-                collideConnected = False,
-                localAnchorA = (-0.3, 0),
-                localAnchorB = (0.36, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.body,
-                bodyB = self.lthigh,
-                collideConnected = False,
-                localAnchorA = (-0.35, -0.4),
-                localAnchorB = (0.3, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 20.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.body,
-                bodyB = self.rthigh,
-                collideConnected = False,
-                localAnchorA = (0.35, -0.4),
-                localAnchorB = (-0.3, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 20.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.rthigh,
-                bodyB = self.rleg,
-                collideConnected = False,
-                localAnchorA = (0.3, 0),
-                localAnchorB = (-0.36, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-        self.joints.append(
-            self.world.CreateRevoluteJoint(
-                bodyA = self.rleg,
-                bodyB = self.rfoot,
-                collideConnected = False,
-                localAnchorA = (0.36, 0),
-                localAnchorB = (-0.2, 0),
-                referenceAngle = pi,
-                enableMotor = True,
-                motorSpeed = 0.0,
-                maxMotorTorque = 10.0
-            ))
-    
-    
-    
-    def update(self, sensors, mirror=False):
-        dpos = self.target - self.body.position
-        if dpos.length > 1:                          # Radius of sight
-            dpos.Normalize()
-        joint_angles = [(j.angle%(2*pi))/pi - 1 for j in self.joints]
-        # Make the limbs angle list symmetric (second half *= -1)
-        for i in range(len(joint_angles)//2 + len(joint_angles)%2, len(joint_angles)):
-            joint_angles[i] *= -1
-        
-        # Add body angle sensor, range [-180, 180] maps to [-1, 1]
-        body_angle = ((self.bodies[0].angle + pi) % (2 * pi) - pi) / pi
-        
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            self.sensors = [-dpos.x, dpos.y] + joint_angles[::-1] + sensors[::-1] + [body_angle]
-        else:
-            self.sensors = [dpos.x, dpos.y] + joint_angles + sensors + [body_angle]
-        
-        # Send input to neural network
-        self.nn.feedforward(self.sensors)
-        
-        # Read output from neural network
-        if dpos.x < 0 or mirror:
-            # Mirror mode
-            self.joints[0].motorSpeed = -self.nn.output[5]*2.0
-            self.joints[1].motorSpeed = -self.nn.output[4]*5.0
-            self.joints[2].motorSpeed = -self.nn.output[3]*8.0
-            self.joints[3].motorSpeed = -self.nn.output[2]*8.0
-            self.joints[4].motorSpeed = -self.nn.output[1]*5.0
-            self.joints[5].motorSpeed = -self.nn.output[0]*2.0
-        else:
-            self.joints[0].motorSpeed = -self.nn.output[0]*2.0
-            self.joints[1].motorSpeed = -self.nn.output[1]*5.0
-            self.joints[2].motorSpeed = -self.nn.output[2]*8.0
-            self.joints[3].motorSpeed = -self.nn.output[3]*8.0
-            self.joints[4].motorSpeed = -self.nn.output[4]*5.0
-            self.joints[5].motorSpeed = -self.nn.output[5]*2.0
+    morpho = "Boulotron2001"
+
+
+
+# Morphologies without a class of their own
+for _morpho in MORPHOLOGIES:
+    if _morpho not in globals():
+        globals()[_morpho] = type(_morpho, (Animatronic,), dict(morpho=_morpho, __module__=__name__))
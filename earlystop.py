@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+from math import pi, inf
+
+
+
+class StuckRule:
+    """ Stop a trial when the creature did not get closer to its target
+        by at least `progress` meters over the last `window` steps
+    """
+    name = "stuck"
+
+    def __init__(self, window=120, progress=0.2):
+        self.window = window
+        self.progress = progress
+
+    def check(self, trial, limit_steps, cutoff):
+        if trial.steps % self.window != 0:
+            return False
+        distance = trial.distance()
+        previous = trial.data.get(self.name)
+        trial.data[self.name] = distance
+        return previous is not None and previous - distance < self.progress
+
+
+
+class FlippedRule:
+    """ Stop a trial when the creature's body stayed upside down
+        (tilted by more than `max_angle` radians) for `window` steps
+        Meaningless for round bodies like the Boulotrons'
+    """
+    name = "flipped"
+
+    def __init__(self, window=60, max_angle=0.75*pi):
+        self.window = window
+        self.max_angle = max_angle
+
+    def check(self, trial, limit_steps, cutoff):
+        # Counted from the step count rather than from the number of checks,
+        # as a step of a coarse physics profile is worth several steps
+        angle = (trial.creature.body.angle + pi) % (2*pi) - pi
+        if abs(angle) <= self.max_angle:
+            trial.data.pop(self.name, None)
+            return False
+        first_step = trial.data.setdefault(self.name, trial.steps)
+        return trial.steps - first_step + 1 >= self.window
+
+
+
+class BoundRule:
+    """ Stop a trial when its score can't get under the selection cutoff
+        anymore, even if the creature ran straight to its target at
+        `max_speed` (in m/s) for the remaining steps
+    """
+    name = "bound"
+
+    def __init__(self, max_speed=2.0, time_step=1.0/60, every=10):
+        self.max_speed = max_speed
+        self.time_step = time_step
+        self.every = every
+
+    def check(self, trial, limit_steps, cutoff):
+        if cutoff == inf or trial.steps % self.every != 0:
+            return False
+        reach = self.max_speed * (limit_steps-trial.steps) * self.time_step
+        return trial.score + max(0, trial.distance() - reach) > cutoff
+
+
+
+RULES = {"stuck": StuckRule,
+         "flipped": FlippedRule,
+         "bound": BoundRule}
+
+
+
+class RunningCutoff:
+    """ Score of the n-th best trial seen so far (lower scores are better),
+        inf until n scores were added
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.best = []     # n best scores, as a max-heap of negated values
+        self.value = inf
+
+    def add(self, score):
+        if self.n <= 0:
+            return
+        if len(self.best) < self.n:
+            heapq.heappush(self.best, -score)
+        elif score < -self.best[0]:
+            heapq.heapreplace(self.best, -score)
+        if len(self.best) == self.n:
+            self.value = -self.best[0]
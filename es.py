@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+
+def centered_ranks(scores):
+    """ Utility of every score, from 0.5 for the best (lowest) one
+        down to -0.5 for the worst one, evenly spaced
+        Insensitive to the scale of scores and to outliers
+    """
+    n = len(scores)
+    ranks = np.empty(n)
+    ranks[np.argsort(scores, kind="stable")] = np.arange(n)
+    if n < 2:
+        return np.zeros(n)
+    return 0.5 - ranks / (n-1)
+
+
+
+class EvolutionStrategy:
+    """ Search distribution over the weights of a neural network:
+        an isotropic Gaussian around a mean genome (lower scores are better)
+
+        Samples come in antithetic pairs, mean + sigma*eps and mean - sigma*eps,
+        whose score difference is a low variance estimate of the slope along
+        eps. The mean moves along the sum of these directions weighted by
+        the rank of the samples' scores, not by the scores themselves.
+    """
+
+    def __init__(self, nn, sigma=0.2, learning_rate=0.1):
+        """
+            Args:
+                nn: neural network the search starts from, also giving the
+                    layers and activation of sampled networks
+                sigma: standard deviation of the perturbations of weights
+                learning_rate: step of the mean along the estimated gradient
+        """
+        self.template = nn.copy()
+        self.mean = nn.get_flat_weights()
+        self.sigma = sigma
+        self.learning_rate = learning_rate
+        self.noise = None
+
+    def network(self, flat=None):
+        """ Neural network with the given flat weights, the mean by default """
+        nn = self.template.copy()
+        nn.set_flat_weights(self.mean if flat is None else flat)
+        return nn
+
+    def ask(self, pairs, rng):
+        """ Returns 2*pairs sampled networks, each one followed by its
+            antithetic twin
+        """
+        self.noise = rng.standard_normal((pairs, len(self.mean)))
+        networks = []
+        for eps in self.noise:
+            networks.append(self.network(self.mean + self.sigma*eps))
+            networks.append(self.network(self.mean - self.sigma*eps))
+        return networks
+
+    def tell(self, scores):
+        """ Move the mean given the scores of the networks of the last ask,
+            in the same order
+            Returns the length of the step
+        """
+        utilities = centered_ranks(np.asarray(scores, dtype=float)).reshape(-1, 2)
+        # Each pair counts for two samples
+        gradient = (utilities[:, 0] - utilities[:, 1]) @ self.noise / (2*len(self.noise)*self.sigma)
+        step = self.learning_rate * gradient
+        self.mean = self.mean + step
+        self.noise = None
+        return float(np.linalg.norm(step))
@@ -5,8 +5,12 @@ import sys
 import os.path
 import argparse
 import datetime
+import time
 import random
+import multiprocessing
+import bisect
 import re
+from math import inf, ceil
 import numpy as np
 import pygame
 from pygame.locals import *
@@ -14,6 +18,16 @@ from nn import *
 import creatures
 from renderer import Camera
 from utils import *
+from terrain import random_terrain, TerrainCache
+from parallel import ParallelEvaluator
+import remote
+from remote import RemoteEvaluator
+import simulation
+from earlystop import RULES, BoundRule, RunningCutoff
+from racing import Race
+from es import EvolutionStrategy
+from novelty import NoveltyArchive
+import islands
 
 # Box2D.b2 maps Box2D.b2Vec2 to vec2 (and so on)
 from Box2D.b2 import (world, polygonShape, edgeShape, staticBody, dynamicBody, pi, vec2, queryCallback, AABB)
@@ -59,13 +73,24 @@ class Evolve:
         self.time_init = datetime.time()
         self.pool = []
         self.stats = Stats()
+        self.rng = np.random.default_rng(self.args.seed)
         
         ### Box2D ###
+        self.terrains = None
+        if self.args.terrains > 0:
+            self.terrains = TerrainCache(self.args.terrain_roughness, self.args.terrains,
+                                         random.getrandbits(32))
         self.build_ground()
         
         self.target = vec2(TARGET) #vec2(random.choice(TARGETS))
         self.display_nn = False
         self.speed_multiplier = 1.0
+        self.physics = simulation.PHYSICS[self.args.physics]
+        self.island = None  # See islands.py
+        self.strategies = None  # Search distribution of every morphology, with --optimizer es
+        self.archive = None
+        if self.args.novelty > 0:
+            self.archive = NoveltyArchive(self.args.archive_size, self.args.novelty_k)
         
         if self.display_mode:
             # --- pygame setup ---
@@ -80,20 +105,16 @@ class Evolve:
     
     def build_ground(self):
         # A static body to hold the ground shape
-        elevation = 0
         if hasattr(self, 'ground'):
             self.world.DestroyBody(self.ground)
-        self.ground = self.world.CreateStaticBody()
         start_posx = round(STARTPOS[0])
         assert -50 < start_posx < 50, "Starting position should be between -50 and 50"
-        for x in range(-50, 50):
-            prev_elevation = elevation
-            elevation = prev_elevation + (random.random()-0.5) * self.args.terrain_roughness*0.01
-            self.ground.CreateEdgeFixture(vertices=[(x,prev_elevation), (x+1,elevation)],
-                                              friction=1.0,
-                                              userData='ground')
-            if x == start_posx:
-                self.startpos_elevation = prev_elevation
+        if self.terrains:
+            self.terrain = self.terrains.choice(random)
+        else:
+            self.terrain = random_terrain(self.args.terrain_roughness, random.getrandbits(32))
+        self.ground = self.terrain.build(self.world)
+        self.startpos_elevation = self.terrain.get_elevation(start_posx)
     
     
     def populate(self):
@@ -101,7 +122,7 @@ class Evolve:
             Create generation 0
         """
         creature_class = getattr(creatures, ANIMATRONIC)
-        for i in range(args.pool_size):
+        for i in range(self.args.pool_size):
             c = creature_class(self.world)
             c.pop_id = FancyWords.generate_two()
             nn = NeuralNetwork()
@@ -126,13 +147,17 @@ class Evolve:
         parents = [w[1] for w in winners]
         # Make copies of every winner
         offspring = []
-        num_copies = round((args.pool_size/len(winners)) - 1)
+        num_copies = round((self.args.pool_size/len(winners)) - 1)
         for i in range(num_copies):
             offspring.extend([d.copy() for d in parents])
+        if self.args.crossover:
+            # Replace the copies' genomes with crossings of the winners
+            networks = breed([p.nn for p in parents], len(offspring),
+                             self.args.crossover == 'gene', self.rng)
+            for c, nn in zip(offspring, networks):
+                c.nn = nn
         # Mutate the copies
-        mutation_count = 0
-        for c in offspring:
-            mutation_count += c.mutate(self.args.mutate)
+        mutation_count = creatures.mutate_batch(offspring, self.args.mutate, self.rng)
         
         self.pool = offspring + parents
         self.generation += 1
@@ -140,12 +165,64 @@ class Evolve:
         print(f"    Total number of mutations: {mutation_count}")
 
 
-    def save_population(self, population):
+    def start_es(self):
+        """
+            Centre a search distribution on the first creature of every
+            morphology of the pool, and sample the first pool from them
+        """
+        self.strategies = dict()
+        for c in self.pool:
+            if c.morpho not in self.strategies:
+                self.strategies[c.morpho] = (c, EvolutionStrategy(c.nn, self.args.es_sigma,
+                                                                  self.args.es_learning_rate))
+        self.sample_pool()
+        print(f"Evolution strategies: {len(self.strategies)} search distributions, "
+              f"{self.pool[0].nn.get_total_synapses()} weights each")
+    
+    
+    def sample_pool(self):
+        """
+            Fill the pool with the mean genome of every search distribution,
+            followed by antithetic pairs of samples around it
+        """
+        self.pool = []
+        self.samples = dict()   # Mean creature and sampled creatures, by morphology
+        pairs = max(1, (self.args.pool_size // len(self.strategies) - 1) // 2)
+        for morpho, (parent, es) in self.strategies.items():
+            mean = parent.copy()
+            mean.nn = es.network()
+            samples = []
+            for nn in es.ask(pairs, self.rng):
+                c = parent.copy()
+                c.nn = nn
+                samples.append(c)
+            self.samples[morpho] = (mean, samples)
+            self.pool.append(mean)
+            self.pool.extend(samples)
+    
+    
+    def next_es_generation(self, podium):
+        """
+            Move every search distribution given the scores of its samples,
+            then sample the next pool
+        """
+        scores = {id(c): score for score, c in podium}
+        for morpho, (parent, es) in self.strategies.items():
+            mean, samples = self.samples[morpho]
+            step = es.tell([scores[id(c)] for c in samples])
+            print(f"    {morpho}: mean genome score {scores[id(mean)]}, step {step:.4f}")
+        self.sample_pool()
+        self.generation += 1
+        print(f"# New pool of {len(self.pool)} drones")
+    
+    
+    def save_population(self, population, name=None):
         c = population[0][1]
         directory = self.get_path(c)
         if not os.path.exists(directory):
             os.makedirs(directory)
-        filename = os.path.join(directory, "gen{}.txt".format(self.generation))
+        name = name or "gen{}".format(self.generation)
+        filename = os.path.join(directory, name + ".txt")
         print(f"Saving to disk... ({filename})")
         save_generation(filename, population,
                        self.stats.var_dict, self.generation)
@@ -153,13 +230,12 @@ class Evolve:
 
     def load_population(self, filename):
         if os.path.isdir(filename):
-            p = re.compile(r'gen(\d+).txt' ,re.IGNORECASE)
-            highest_gen = 0
-            for f in os.listdir(filename):
-                m = p.match(f)
-                if m and int(m[1]) > highest_gen:
-                    highest_gen = int(m[1])
-            filename = os.path.join(filename, f'gen{highest_gen}.txt')
+            # Generational saves are named by generation, steady-state ones
+            # by evaluation: the latest one written is resumed
+            p = re.compile(r'(gen|eval)(\d+).txt' ,re.IGNORECASE)
+            saves = [os.path.join(filename, f) for f in os.listdir(filename) if p.match(f)]
+            filename = max(saves, key=lambda f: (os.path.getmtime(f), int(p.match(os.path.basename(f))[2])),
+                           default=os.path.join(filename, 'gen0.txt'))
         
         data = import_generation(filename, self.world)
         self.pool = data["population"]
@@ -194,10 +270,369 @@ class Evolve:
         return creature
         
         
+    def end_generation(self, podium):
+        """
+            Select the winners of a fully evaluated pool and breed the next one
+            Returns False when the simulation should stop
+        """
+        # Creatures dropped by successive halving have no final score
+        scored = [l[0] for l in podium if l[0] < inf]
+        gen_score = sum(scored) / len(scored)
+        podium.sort(key=lambda x: x[0])
+        winners_number = max(1, int(len(podium) * self.args.winners_percent/100))
+        winners = podium[:winners_number]
+        self.stats.feed(self.generation, gen_score, winners[0][0], winners[-1][0])
+        # Save winners to file every X generations
+        if self.generation > 1 and self.generation%self.args.save_interval == 0:
+            if self.strategies:
+                # Mean genomes are what evolution strategies evolve, save them first
+                means = [mean for mean, samples in self.samples.values()]
+                self.save_population([l for l in podium if l[1] in means] +
+                                     [w for w in winners if w[1] not in means])
+            else:
+                self.save_population(winners)
+            if PLOT_EVOLUTION:
+                c = winners[0][1]
+                filename = "gen{}.png".format(self.generation)
+                filename = os.path.join(self.get_path(c), filename)
+                title = "{} {}".format(c.pop_id, str(c.nn.get_layers()))
+                self.stats.savePlot(filename, title)
+        print(f"    Generation score: {gen_score}")
+        print(f"    {len(winners)} creatures selected")
+        print(f"    Generation time: {time.perf_counter()-self.generation_start:.2f}s")
+        print(f"# End of generation {self.generation}\n")
+        
+        if self.generation >= self.args.end_generation:
+            return False
+        self.build_ground() # Change ground topology
+        if self.strategies:
+            self.next_es_generation(podium)
+        else:
+            self.next_generation(winners)
+        self.generation_start = time.perf_counter()
+        return True
+    
+    
+    def evaluate_pool(self, evaluator, cache=None, pool=None, terrain=None, steps=None,
+                      selected=None):
+        """
+            Score every creature of the pool on the current terrain
+            Identical genomes are simulated only once, and not at all
+            if their score on this terrain is already in the cache
+            
+            Args:
+                pool: creatures to score instead of the whole pool
+                terrain: instead of the current terrain
+                steps: instead of limit_steps
+                selected: number of best creatures that go through, for
+                          early stop rules (winners_percent of the pool by
+                          default, 0 disables early stop)
+        """
+        pool = self.pool if pool is None else pool
+        terrain = terrain or self.terrain
+        steps = steps or self.args.limit_steps
+        if selected is None:
+            selected = int(len(pool) * self.args.winners_percent/100)
+        early_stop = self.early_stop if selected > 0 else ()
+        cutoff = None
+        if early_stop:
+            cutoff = RunningCutoff(selected)
+        
+        if cache is None:
+            genomes = [c.get_genome() for c in pool]
+            scores = evaluator.evaluate(genomes, terrain, steps, early_stop, cutoff)
+            if early_stop:
+                self.print_early_stop(evaluator)
+            return scores
+        
+        scores = [None] * len(pool)
+        pending = dict()    # Indices of creatures to simulate, by cache key
+        for i, c in enumerate(pool):
+            key = cache.get_key(c.get_genome(), terrain, steps)
+            if key in pending:
+                # Duplicate of a genome already waiting for simulation
+                cache.hits += 1
+                pending[key].append(i)
+                continue
+            scores[i] = cache.get(key)
+            if scores[i] is None:
+                pending[key] = [i]
+            elif cutoff:
+                cutoff.add(scores[i])
+        
+        keys = list(pending)
+        genomes = [pool[pending[k][0]].get_genome() for k in keys]
+        results = evaluator.evaluate(genomes, terrain, steps, early_stop, cutoff)
+        for key, score, aborted in zip(keys, results, evaluator.aborted):
+            if not aborted:
+                # Aborted trials don't have their real score
+                cache.put(key, score)
+            for i in pending[key]:
+                scores[i] = score
+        if early_stop:
+            self.print_early_stop(evaluator)
+        return scores
+    
+    
+    def halve_pool(self, evaluator, cache=None):
+        """
+            Successive halving: score the whole pool over a short horizon,
+            keep the best ones and score them again over a longer horizon,
+            and so on up to limit_steps
+            
+            The last rung holds at least the winners of the generation, the
+            creatures dropped before are given an infinite score
+        """
+        rungs = self.args.rungs
+        if rungs < 2:
+            return self.evaluate_pool(evaluator, cache)
+        keep = self.args.rung_keep / 100
+        winners_number = int(len(self.pool) * self.args.winners_percent/100)
+        scores = [inf] * len(self.pool)
+        indices = list(range(len(self.pool)))
+        total_steps = 0
+        for rung in range(rungs):
+            steps = max(1, round(self.args.limit_steps * keep**(rungs-1-rung)))
+            last = rung == rungs-1
+            selected = winners_number if last else max(winners_number, ceil(len(indices)*keep))
+            pool = [self.pool[i] for i in indices]
+            rung_scores = self.evaluate_pool(evaluator, cache, pool, steps=steps, selected=selected)
+            print(f"    Rung {rung+1}: {len(indices)} creatures x {steps} steps")
+            total_steps += len(indices) * steps
+            if last:
+                for i, score in zip(indices, rung_scores):
+                    scores[i] = score
+            else:
+                best = sorted(range(len(indices)), key=lambda j: rung_scores[j])[:selected]
+                indices = [indices[j] for j in sorted(best)]
+        full_steps = len(self.pool) * self.args.limit_steps
+        print(f"    Successive halving: {total_steps} steps instead of {full_steps} ({total_steps/full_steps:.0%})")
+        return scores
+    
+    
+    def race_terrains(self):
+        """
+            Terrains every creature of a race may be scored on, in order,
+            starting with the current terrain
+        """
+        rng = random.Random(random.getrandbits(32))
+        if self.terrains:
+            others = [t for t in self.terrains.terrains if not t.is_same(self.terrain)]
+            return [self.terrain] + rng.sample(others, min(len(others), self.args.race-1))
+        return [self.terrain] + [random_terrain(self.args.terrain_roughness, rng.getrandbits(32))
+                                 for i in range(self.args.race-1)]
+    
+    
+    def race_pool(self, evaluator, cache=None):
+        """
+            Score every creature of the pool (see halve_pool), then
+            score the ones that are too close to the selection cutoff to
+            tell on more terrains, until they aren't or until the budget
+            of extra trials is spent (see racing.Race)
+        """
+        scores = self.halve_pool(evaluator, cache)
+        if self.args.race < 2:
+            return scores
+        terrains = self.race_terrains()
+        winners_number = max(1, int(len(self.pool) * self.args.winners_percent/100))
+        # Only creatures that made it to the last rung of successive halving
+        ranked = [i for i, score in enumerate(scores) if score < inf]
+        race = Race(len(ranked), winners_number, len(terrains))
+        race.add(range(len(ranked)), [scores[i] for i in ranked])
+        budget = len(self.pool) * self.args.race_budget // 100
+        extra_trials = 0
+        while extra_trials < budget:
+            # Rounds of at most twice the number of winners, so the first
+            # ones are spent on the closest calls
+            undecided = race.undecided()[:min(budget-extra_trials, 2*winners_number)]
+            if not undecided:
+                break
+            for n in sorted(set(race.counts[undecided])):
+                indices = [i for i in undecided if race.counts[i] == n]
+                pool = [self.pool[ranked[i]] for i in indices]
+                race.add(indices, self.evaluate_pool(evaluator, cache, pool, terrains[n], selected=0))
+            extra_trials += len(undecided)
+        print(f"    Racing: {extra_trials} extra trials, {len(race.undecided())} creatures still undecided")
+        for i, score in zip(ranked, race.means().tolist()):
+            scores[i] = score
+        return scores
+    
+    
+    def add_novelty(self, scores, behaviours):
+        """
+            Novelty search: lower the score of every creature by the novelty
+            of its behaviour (see novelty.py) times args.novelty, and
+            archive the most novel behaviours
+        """
+        t0 = time.perf_counter()
+        novelty = self.archive.novelty(behaviours)
+        most_novel = np.argsort(-novelty, kind="stable")[:self.args.archive_add]
+        self.archive.add([behaviours[i] for i in most_novel])
+        print(f"    Novelty: mean {novelty.mean():.3f}, best {novelty.max():.3f}, best distance score {min(scores):.3f}, "
+              f"{len(self.archive)} behaviours archived ({time.perf_counter()-t0:.3f}s)")
+        return [score - self.args.novelty*n for score, n in zip(scores, novelty.tolist())]
+    
+    
+    def print_early_stop(self, evaluator):
+        if self.early_stop:
+            print(f"    Early stop: {sum(evaluator.aborted)} trials aborted, {evaluator.steps_saved} steps saved")
+    
+    
+    def new_evaluator(self):
+        """ Evaluator of headless modes, and their early stop rules """
+        options = dict(pooled=self.args.pool_bodies,
+                       settle_steps=self.args.settle_steps,
+                       control_every=self.args.control_every,
+                       physics=self.args.physics)
+        if self.archive is not None:
+            options["record_every"] = self.args.behaviour_every
+        self.early_stop = []
+        for name in self.args.early_stop:
+            if name == "bound":
+                self.early_stop.append(BoundRule(self.args.max_speed, simulation.TIME_STEP))
+            else:
+                self.early_stop.append(RULES[name]())
+        if self.args.serve:
+            return RemoteEvaluator(self.args.authkey, self.args.port, self.args.batch,
+                                   self.args.workers, self.args.bind, **options)
+        return ParallelEvaluator(self.args.workers, self.args.batch, **options)
+    
+    
+    def headlessLoop(self):
+        """
+            Evaluate whole generations without display, possibly spread
+            over several worker processes
+        """
+        evaluator = self.new_evaluator()
+        cache = None
+        # Pooled bodies give approximate scores, not worth keeping
+        if self.args.cache_size > 0 and self.archive is None and not self.args.pool_bodies:
+            cache = simulation.FitnessCache(self.args.cache_size, evaluator.options)
+        self.generation_start = time.perf_counter()
+        running = True
+        while running:
+            if cache:
+                cache.reset_counters()
+            if self.archive is not None:
+                # Every creature's behaviour is needed: no cache, early stop, racing nor rungs
+                scores = self.add_novelty(self.evaluate_pool(evaluator, selected=0),
+                                          evaluator.behaviours)
+            else:
+                scores = self.race_pool(evaluator, cache)
+            if cache:
+                print(f"    Fitness cache: {cache.hits} hits, {cache.misses} misses")
+            # Creatures are popped from the end of the pool in mainLoop,
+            # keep the same podium order so ties are broken the same way
+            podium = list(zip(scores, self.pool))[::-1]
+            if not BREED:
+                break
+            generation = self.generation
+            running = self.end_generation(podium)
+            if self.island:
+                self.island.end_generation(self, generation, podium, running)
+        evaluator.close()
+    
+    
+    def tournament(self, ranked):
+        """ Best of `tournament` creatures picked at random in a ranked population """
+        picks = self.rng.choice(len(ranked), min(self.args.tournament, len(ranked)), replace=False)
+        return ranked[min(picks)][2]
+    
+    
+    def offspring(self, ranked):
+        """ Mutated copy of a parent chosen by tournament, or mutated child
+            of two of them with crossover
+        """
+        parent = self.tournament(ranked)
+        if self.args.crossover:
+            child = parent.breed(self.tournament(ranked), self.args.crossover == 'gene', self.rng)
+        else:
+            child = parent.copy()
+        child.mutate(self.args.mutate, self.rng)
+        return child
+    
+    
+    def end_period(self, ranked):
+        """
+            Stats and saves of steady-state evolution, every pool_size
+            evaluations
+        """
+        self.generation += 1
+        scores = [r[0] for r in ranked]
+        winners_number = max(1, int(len(ranked) * self.args.winners_percent/100))
+        winners = [(r[0], r[2]) for r in ranked[:winners_number]]
+        pop_score = sum(scores) / len(scores)
+        self.stats.feed(self.evaluations, pop_score, scores[0], scores[winners_number-1])
+        if self.generation % self.args.save_interval == 0:
+            self.save_population(winners, f"eval{self.evaluations}")
+            if PLOT_EVOLUTION:
+                c = winners[0][1]
+                filename = os.path.join(self.get_path(c), f"eval{self.evaluations}.png")
+                title = "{} {}".format(c.pop_id, str(c.nn.get_layers()))
+                self.stats.savePlot(filename, title)
+        print(f"    Population score: {pop_score}")
+        print(f"    Best score: {scores[0]}")
+        print(f"    Time: {time.perf_counter()-self.generation_start:.2f}s")
+        print(f"# {self.evaluations} evaluations\n")
+        self.generation_start = time.perf_counter()
+        self.build_ground() # Change ground topology
+    
+    
+    def steadyLoop(self):
+        """
+            Steady-state evolution, without generations: every score that
+            comes back is ranked in a population of pool_size creatures,
+            pushing the worst one out, and a new offspring of parents
+            chosen by tournament is sent to evaluation right away
+            
+            Workers never wait for the slowest trials of a generation.
+            Stats, saves and terrain changes happen every pool_size
+            evaluations, and run lengths are counted in evaluations
+            (end_generation times pool_size)
+        """
+        evaluator = self.new_evaluator()
+        pool_size = self.args.pool_size
+        max_evaluations = (self.args.end_generation + 1) * pool_size
+        ranked = []     # (score, evaluation number, creature), best first
+        waiting = self.pool[::-1]   # Creatures to evaluate before any offspring
+        # A resumed run goes on counting from its last save
+        self.evaluations = self.generation * pool_size
+        dispatched = self.evaluations
+        in_flight = 0
+        self.generation_start = time.perf_counter()
+        while self.evaluations < max_evaluations:
+            # Keep every worker busy
+            while in_flight < evaluator.capacity() and dispatched < max_evaluations:
+                if not waiting and not ranked:
+                    break
+                batch = []
+                while len(batch) < self.args.batch and dispatched < max_evaluations:
+                    batch.append(waiting.pop() if waiting else self.offspring(ranked))
+                    dispatched += 1
+                # Creatures that can't beat the worst of a full population can be stopped early
+                cutoff = ranked[-1][0] if len(ranked) >= pool_size else inf
+                evaluator.submit(batch, [c.get_genome() for c in batch], self.terrain,
+                                 self.args.limit_steps, self.early_stop, cutoff)
+                in_flight += 1
+            batch, results = evaluator.collect()
+            in_flight -= 1
+            for c, (score, steps, aborted, behaviour) in zip(batch, results):
+                self.evaluations += 1
+                # Aborted trials are ranked with their pessimistic score
+                # (see simulation.Evaluator.run_trials)
+                bisect.insort(ranked, (score, self.evaluations, c))
+                if len(ranked) > pool_size:
+                    ranked.pop()
+                if self.evaluations % pool_size == 0:
+                    self.end_period(ranked)
+        evaluator.close()
+    
+    
     def mainLoop(self):
         podium = []
         creature = self.pop_creature()
         steps = 0
+        control_steps = 0   # Physics steps since the start of the trial
         mirror = False
         mouse_drag = False
         selected_neuron = None
@@ -205,6 +640,7 @@ class Evolve:
         paused = False
         running = True
         score = 0
+        self.generation_start = time.perf_counter()
         while running:
         
             #### PyGame ####
@@ -266,7 +702,9 @@ class Evolve:
                         running = False
                             
             if not paused:
-                creature.update(self.world.contactListener.sensors[creature.id][:-1], mirror)
+                if control_steps % self.args.control_every == 0:
+                    creature.update(creature.contact_sensors(), mirror)
+                control_steps += 1
             
             #### PyGame ####
             if self.display_mode:
@@ -329,21 +767,22 @@ class Evolve:
                                 pygame.draw.circle(self.screen, color, (x, y), 6)
 
                 pygame.display.flip()
-                self.clock.tick(TARGET_FPS)
+                self.clock.tick(TARGET_FPS / self.physics.frames)
             
             if paused:
                 continue
             
-            self.world.Step(TIME_STEP*self.speed_multiplier, 6, 2)
+            self.physics.step(self.world, self.speed_multiplier)
             
             if SLOUCHING_PENALTY != 0:
-                if self.world.contactListener.sensors[creature.id][-1]:
-                    score += SLOUCHING_PENALTY
+                if creature.touching_ground():
+                    score += SLOUCHING_PENALTY * self.physics.frames
             
-            steps += 1 * self.speed_multiplier
+            steps += self.physics.frames * self.speed_multiplier
             if steps >= self.args.limit_steps or not creature.body.awake:
                 # End of trial for this creature
                 steps = 0
+                control_steps = 0
                 score += (creature.target - creature.body.position).length
                 podium.append((score, creature,))
                 creature.destroy()
@@ -358,35 +797,30 @@ class Evolve:
                         running = False
                         break
                     
-                    gen_score = sum([l[0] for l in podium]) / len(podium)
-                    podium.sort(key=lambda x: x[0])
-                    winners_number = int(len(podium) * args.winners_percent/100)
-                    winners = podium[:winners_number]
+                    running = self.end_generation(podium)
                     podium.clear()
-                    self.stats.feed(self.generation, gen_score, winners[0][0], winners[-1][0])
-                    # Save winners to file every X generations
-                    if self.generation > 1 and self.generation%self.args.save_interval == 0:
-                        self.save_population(winners)
-                        if PLOT_EVOLUTION:
-                            c = winners[0][1]
-                            filename = "gen{}.png".format(self.generation)
-                            filename = os.path.join(self.get_path(c), filename)
-                            title = "{} {}".format(c.pop_id, str(c.nn.get_layers()))
-                            self.stats.savePlot(filename, title)
-                    print(f"    Generation score: {gen_score}")
-                    print(f"    {len(winners)} creatures selected")
-                    print(f"# End of generation {self.generation}\n")
-                    
-                    if self.generation >= args.end_generation:
-                        running = False
-                    else:
-                        self.build_ground() # Change ground topology
-                        self.next_generation(winners)
+                    if running:
                         creature = self.pop_creature()
 
 
 
 
+def run_island(args, island):
+    """ Evolve the population of an island, in its own process (see islands.py) """
+    evolve = Evolve(args)
+    evolve.island = island
+    if args.file:
+        evolve.load_population(args.file)
+        if args.optimizer == 'ga':
+            evolve.next_generation([(d.score, d) for d in evolve.pool])
+    else:
+        evolve.populate()
+    if args.optimizer == 'es':
+        evolve.start_es()
+    evolve.headlessLoop()
+
+
+
 def parseInputs():
     parser = argparse.ArgumentParser(description='')
     parser.add_argument('-v', '--view', action='store_true', help='enable presentation mode')
@@ -394,12 +828,66 @@ def parseInputs():
                         help='mutation frequency multiplier (defaults to 2)')
     parser.add_argument('-f', '--file', type=str, help='population file')
     parser.add_argument('-t', '--terrain_roughness', type=int, default=30, help='terrain variation in elevation (in percent)')
+    parser.add_argument('--terrains', type=int, default=0, help='number of pre-generated terrains to pick from at every generation (defaults to 0, a new terrain every generation)')
     parser.add_argument('-s', '--save_interval', type=int, default=10, help='save population to disk every X generations')
     parser.add_argument('-l', '--limit_steps', type=int, default=500, help='max number of steps for each individual trial (defaults to 500)')
     parser.add_argument('-p', '--pool_size', type=int, default=200, help='size of creature population (defaults to 200)')
     parser.add_argument('-w', '--winners_percent', type=int, default=10, help='percent of selected individuals per generation')
     parser.add_argument('-e', '--end_generation', type=int, default=500, help='limit simulation to this number of generations (defaults to 500)')
-    return parser.parse_args()
+    parser.add_argument('--workers', type=int, default=0, help='number of worker processes evaluating the pool, headless only (defaults to 0, evaluate in this process)')
+    parser.add_argument('--batch', type=int, default=1, help=f'number of creatures simulated together in the same world, headless only (defaults to 1, at most {simulation.MAX_BATCH})')
+    parser.add_argument('--pool_bodies', action='store_true', help='reuse creatures\' bodies from one trial to the next instead of building new ones, faster on short trials but scores are approximate (no --cache_size), headless only')
+    parser.add_argument('--settle_steps', type=int, default=0, help='start trials with the creature already lying on the ground, after letting it fall once for at most this number of steps, headless only (defaults to 0, trials start with the fall)')
+    parser.add_argument('--control_every', type=int, default=1, help='feed neural networks forward once every X physics steps, holding motor speeds in between (defaults to 1, every step)')
+    parser.add_argument('--physics', choices=list(simulation.PHYSICS), default='default', help='physics fidelity profile: timestep, solver iterations and substeps (defaults to "default", 60 Hz with 6 velocity and 2 position iterations)')
+    parser.add_argument('-x', '--crossover', choices=['weight', 'gene'], help='breed offspring from pairs of winners, inheriting single weights or whole genes (disabled by default)')
+    parser.add_argument('--cache_size', type=int, default=4096, help='number of scores kept to skip simulating identical genomes on the same terrain, headless only (defaults to 4096, 0 to disable)')
+    parser.add_argument('--early_stop', nargs='+', choices=list(RULES), default=[], help='abort trials of creatures that are stuck, flipped over, or that can no longer be selected (bound), headless only')
+    parser.add_argument('--max_speed', type=float, default=2.0, help='highest creature speed in m/s assumed by the "bound" early stop rule (defaults to 2)')
+    parser.add_argument('--race', type=int, default=1, help='score creatures that are close to the selection cutoff on up to this number of terrains, headless only (defaults to 1, a single terrain per generation)')
+    parser.add_argument('--race_budget', type=int, default=50, help='extra trials allowed by --race per generation, in percent of the pool size (defaults to 50)')
+    parser.add_argument('--rungs', type=int, default=1, help='successive halving: score the pool over this number of horizons growing up to limit_steps, keeping only the best creatures from one to the next, headless only (defaults to 1, every creature gets limit_steps)')
+    parser.add_argument('--rung_keep', type=int, default=33, help='percent of creatures kept from one rung to the next, also the ratio between horizons (defaults to 33)')
+    parser.add_argument('--steady_state', action='store_true', help='evolve without generations: each score is ranked as soon as it comes back and replaced by an offspring of parents chosen by tournament, stats and saves every pool_size evaluations, headless only (no --race, --rungs nor --islands, --optimizer ga only)')
+    parser.add_argument('--tournament', type=int, default=3, help='number of creatures competing to be a parent in steady-state mode (defaults to 3)')
+    parser.add_argument('--optimizer', choices=['ga', 'es'], default='ga', help='"ga": winners and their mutated copies, "es": evolution strategies, a mean genome per morphology moved by the ranks of antithetic Gaussian perturbations of its weights (defaults to "ga")')
+    parser.add_argument('--es_sigma', type=float, default=0.2, help='standard deviation of the perturbations of weights with --optimizer es (defaults to 0.2)')
+    parser.add_argument('--es_learning_rate', type=float, default=0.1, help='step of the mean genome with --optimizer es (defaults to 0.1)')
+    parser.add_argument('--novelty', type=float, default=0, help='novelty search: lower scores by this weight times the mean distance between a creature\'s behaviour (its trajectory) and its nearest neighbours among past and current behaviours, headless only, no --steady_state, --early_stop, --race nor --rungs, disables --cache_size (defaults to 0, disabled)')
+    parser.add_argument('--novelty_k', type=int, default=15, help='number of nearest neighbours of the novelty score (defaults to 15)')
+    parser.add_argument('--behaviour_every', type=int, default=100, help='steps between two positions of a creature\'s trajectory, for novelty search (defaults to 100)')
+    parser.add_argument('--archive_size', type=int, default=5000, help='number of behaviours kept for novelty search, oldest ones are forgotten first (defaults to 5000)')
+    parser.add_argument('--archive_add', type=int, default=5, help='number of most novel behaviours archived every generation (defaults to 5)')
+    parser.add_argument('--islands', type=int, default=1, help='evolve this number of populations in their own processes, exchanging their best creatures (see --migration_interval), headless only, --optimizer ga only (defaults to 1)')
+    parser.add_argument('--migration_interval', type=int, default=10, help='number of generations between migrations from an island to the next (defaults to 10)')
+    parser.add_argument('--migrants', type=int, default=2, help='number of best creatures sent to the next island at every migration (defaults to 2)')
+    parser.add_argument('--island_mutate', type=int, nargs='+', help='mutate value of every island, in turn (defaults to --mutate)')
+    parser.add_argument('--island_roughness', type=int, nargs='+', help='terrain roughness of every island, in turn (defaults to --terrain_roughness)')
+    parser.add_argument('--serve', action='store_true', help='hand trials out to workers connecting over TCP (see --worker), --workers also start that many of them on this machine, headless only')
+    parser.add_argument('--worker', type=str, metavar='HOST', help='evaluate trials for the evolve.py --serve running on HOST (or HOST:PORT), with as many processes as --workers')
+    parser.add_argument('--port', type=int, default=remote.PORT, help=f'TCP port of --serve and --worker (defaults to {remote.PORT})')
+    parser.add_argument('--bind', type=str, default='localhost', help='address --serve listens on, "" for every interface (defaults to localhost, workers on this machine only)')
+    parser.add_argument('--authkey', type=str, help=f'secret key shared by --serve and its workers, required by both (defaults to the {remote.AUTHKEY_VARIABLE} environment variable)')
+    parser.add_argument('--seed', type=int, help='random seed, for reproducible runs')
+    args = parser.parse_args()
+    args.authkey = (args.authkey or os.environ.get(remote.AUTHKEY_VARIABLE, "")).encode()
+    if (args.serve or args.worker) and not args.authkey:
+        parser.error(f"--serve and --worker need a secret key: --authkey or {remote.AUTHKEY_VARIABLE}")
+    if args.steady_state and args.optimizer != 'ga':
+        parser.error("--steady_state only works with --optimizer ga")
+    if args.steady_state and args.islands > 1:
+        parser.error("--steady_state can't be used with --islands")
+    if args.steady_state and (args.race > 1 or args.rungs > 1):
+        parser.error("--steady_state can't be used with --race nor --rungs")
+    if args.novelty > 0 and args.steady_state:
+        parser.error("--novelty can't be used with --steady_state")
+    if args.novelty > 0 and (args.race > 1 or args.rungs > 1 or args.early_stop):
+        # Every creature's whole trial is needed for its behaviour
+        parser.error("--novelty can't be used with --race, --rungs nor --early_stop")
+    if args.islands > 1 and args.optimizer != 'ga':
+        # Migrants would take the place of samples of the search distribution
+        parser.error("--islands only works with --optimizer ga")
+    return args
 
 
 if __name__ == "__main__":
@@ -410,23 +898,67 @@ if __name__ == "__main__":
     args.save_interval = max(1, args.save_interval)
     args.limit_steps = max(50, args.limit_steps)
     args.winners_percent = min(100, max(1, args.winners_percent))
+    args.workers = max(0, args.workers)
+    args.batch = min(simulation.MAX_BATCH, max(1, args.batch))
+    args.control_every = max(1, args.control_every)
+    args.race = max(1, args.race)
+    args.race_budget = max(0, args.race_budget)
+    args.rungs = max(1, args.rungs)
+    args.rung_keep = min(100, max(1, args.rung_keep))
+    args.tournament = max(1, args.tournament)
+    args.migration_interval = max(1, args.migration_interval)
+    args.migrants = max(0, args.migrants)
+    args.novelty_k = max(1, args.novelty_k)
+    args.behaviour_every = min(args.limit_steps, max(1, args.behaviour_every))
+    args.archive_size = max(1, args.archive_size)
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+    
+    if args.worker:
+        address = remote.parse_address(args.worker, args.port)
+        workers = [multiprocessing.Process(target=remote.work, args=(address, args.authkey))
+                   for i in range(args.workers)]
+        for p in workers:
+            p.start()
+        if not workers:
+            remote.work(address, args.authkey)
+        for p in workers:
+            p.join()
+        sys.exit()
+    
+    if args.islands > 1 and not args.view:
+        islands.run(args, run_island)
+        print('Done!')
+        sys.exit()
     
     evolve = Evolve(args)
     print("Parameters :")
     for k,v in args.__dict__.items():
+        if k == "authkey":
+            v = "(hidden)" if v else None
         print(f"  {k}: {v}")
     
     if args.file:
         evolve.load_population(args.file)
-        evolve.next_generation([(d.score, d) for d in evolve.pool])  #TODO: could be simplified
+        # Steady-state runs breed offspring of the saved winners as they go
+        if args.optimizer == 'ga' and not args.steady_state:
+            evolve.next_generation([(d.score, d) for d in evolve.pool])  #TODO: could be simplified
         if args.view:
             pygame.display.set_caption('Neuranim Evolve  --  ' + 
                     evolve.pool[0].pop_id +
                     f' [{args.file.split(os.path.sep)[-1]}]')
     else:
         evolve.populate()
+    if args.optimizer == 'es':
+        evolve.start_es()
     
-    evolve.mainLoop()
+    if args.view:
+        evolve.mainLoop()
+    elif args.steady_state:
+        evolve.steadyLoop()
+    else:
+        evolve.headlessLoop()
     
     pygame.quit()
     print('Done!')
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Island model: several populations evolved side by side in their own
+    processes, possibly with different settings, which send their best
+    creatures to the next island every few generations (ring topology)
+
+    Every island writes its usual output to run/island<N>.log and reports
+    its generation stats to the main process, which prints them merged.
+"""
+
+import contextlib
+import copy
+import os
+import queue
+import random
+import multiprocessing
+import numpy as np
+import matplotlib.pyplot as plt
+import creatures
+
+
+# Seconds an island waits for the migrants of the previous one before
+# going on without them
+MIGRATION_TIMEOUT = 600
+
+
+
+class Island:
+    """ Link between an island's Evolve and the other islands """
+
+    def __init__(self, index, inbox, outbox, reports, interval=10, migrants=2):
+        """
+            Args:
+                inbox: queue of migrants sent by the previous island, or
+                       None once the previous island has stopped
+                outbox: inbox of the next island
+                reports: queue of generation stats, read by the main process
+                interval: number of generations between migrations
+                migrants: number of creatures sent at every migration
+        """
+        self.index = index
+        self.inbox = inbox
+        self.outbox = outbox
+        self.reports = reports
+        self.interval = interval
+        self.migrants = migrants
+
+    def end_generation(self, evolve, generation, podium, running):
+        """ Report the stats of a generation and, every `interval`
+            generations, send the best creatures of the podium (sorted best
+            first) to the next island and put the ones received in place of
+            offspring in the next pool
+        """
+        stats = evolve.stats.var_dict
+        self.reports.put((self.index, generation, stats[1][-1], stats[2][-1]))
+        if not running or generation == 0 or generation % self.interval != 0:
+            return
+        self.outbox.put([c.get_genome() for score, c in podium[:self.migrants]])
+        if self.inbox is None:
+            return
+        try:
+            incoming = self.inbox.get(timeout=MIGRATION_TIMEOUT)
+        except queue.Empty:
+            print("    No migrants received")
+            return
+        if incoming is None:
+            print("    Previous island stopped, no more migrants")
+            self.inbox = None
+            return
+        for i, (morpho, nn) in enumerate(incoming):
+            c = getattr(creatures, morpho)(evolve.world)
+            c.nn = nn
+            # Migrants join the island's population, and its save directory
+            c.pop_id = evolve.pool[i].pop_id
+            evolve.pool[i] = c
+        print(f"    {len(incoming)} migrants received")
+
+
+
+def island_args(args, index):
+    """ Arguments of an island: its own seed, and its own mutate and
+        terrain_roughness values if several were given
+    """
+    island_args = copy.copy(args)
+    island_args.islands = 1
+    if args.seed is not None:
+        island_args.seed = args.seed + index
+    if args.island_mutate:
+        island_args.mutate = max(1, args.island_mutate[index % len(args.island_mutate)])
+    if args.island_roughness:
+        island_args.terrain_roughness = max(0, args.island_roughness[index % len(args.island_roughness)])
+    return island_args
+
+
+def _run_island(target, args, island):
+    log_path = os.path.join("run", f"island{island.index}.log")
+    with open(log_path, "w", buffering=1) as log, contextlib.redirect_stdout(log):
+        # Forked processes share their parent's random state
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+        try:
+            target(args, island)
+        finally:
+            island.reports.put((island.index, None, None, None))
+
+
+def run(args, target):
+    """ Evolve args.islands islands and print their merged stats
+
+        Args:
+            target: function evolving the population of an island, called
+                    as target(args, island) in the island's process
+    """
+    n = args.islands
+    os.makedirs("run", exist_ok=True)
+    inboxes = [multiprocessing.Queue() for i in range(n)]
+    reports = multiprocessing.Queue()
+    processes = []
+    for i in range(n):
+        island = Island(i, inboxes[i], inboxes[(i+1) % n], reports,
+                        args.migration_interval, args.migrants)
+        a = island_args(args, i)
+        print(f"Island {i}: mutate {a.mutate}, terrain roughness {a.terrain_roughness}, "
+              f"log in run/island{i}.log")
+        processes.append(multiprocessing.Process(target=_run_island, args=(target, a, island)))
+    for p in processes:
+        p.start()
+
+    # Stats of every island, by generation
+    generations = dict()    # Islands that reported each generation not printed yet
+    gen_scores = [dict() for i in range(n)]
+    best_scores = [dict() for i in range(n)]
+    alive = set(range(n))
+    while alive:
+        index, generation, gen_score, best = reports.get()
+        if generation is None:
+            alive.discard(index)
+            # Don't let the next island wait for migrants that won't come
+            inboxes[(index+1) % n].put(None)
+        else:
+            gen_scores[index][generation] = gen_score
+            best_scores[index][generation] = best
+            generations.setdefault(generation, set()).add(index)
+        # Print generations reported by every island still running, in order
+        for generation in sorted(generations):
+            if not alive <= generations[generation]:
+                break
+            reported = sorted(generations.pop(generation))
+            bests = [best_scores[i][generation] for i in reported]
+            mean = sum([gen_scores[i][generation] for i in reported]) / len(reported)
+            best_island = reported[int(np.argmin(bests))]
+            print(f"Generation {generation}: best {min(bests):.3f} (island {best_island}), "
+                  f"mean score {mean:.3f}  | " + "  ".join([f"{best_scores[i][generation]:.3f}"
+                                                            if i in reported else "-"
+                                                            for i in range(n)]))
+    for p in processes:
+        p.join()
+
+    plt.close()
+    for i in range(n):
+        gens = sorted(best_scores[i])
+        plt.plot(gens, [best_scores[i][g] for g in gens], label=f"island {i} best")
+        plt.plot(gens, [gen_scores[i][g] for g in gens], ':', label=f"island {i} gen score")
+    plt.legend()
+    plt.title(f"{n} islands")
+    plt.savefig(os.path.join("run", "islands.png"))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Creature morphologies, described as plain data
+
+    Every morphology is a dict with:
+        fixtures: (body name, fixture) pairs, in creation order.
+                  A body is created the first time it is named, at the
+                  creature's starting position.
+                  The first body is the main one (Animatronic.body), every
+                  body is also available as an attribute of the creature.
+                  A fixture has a shape, `box` (half width, half height) or
+                  `radius` (circle, centered on `pos`), and any other
+                  Box2D fixture property (density, friction, restitution,
+                  isSensor, groupIndex).
+                  A fixture with a `sensor` number is a contact sensor,
+                  its value is set when it touches the ground.
+        joints: revolute joints with motors, as (body A, body B,
+                local anchor A, local anchor B, max motor torque).
+                Joints are listed symmetrically, left to right, so the
+                list can be reversed in mirror mode. So are contact
+                sensors numbers.
+        gains: motor speed multiplier of every joint, applied to the
+               neural network output
+        mirror_gains: same as gains, in mirror mode
+        body_angle: add the main body angle to the neural network inputs
+
+    The neural network input layer is:
+        [target.x] [target.y] [joints angles] [contact sensors] ([body angle])
+    and its output layer holds a speed for every joint motor.
+"""
+
+from math import pi
+
+
+
+CUBOTRON1000 = dict(
+    #     (0)-----x-----(1) [[[ BODY ]]] (2)-----x-----(3)
+    fixtures = [
+        ("body", dict(box=(0.5, 0.5), density=1, friction=0.3)),
+        ## Ground/Body sensors
+        ("body", dict(radius=0.15, pos=(-0.5, 0.5), density=0, isSensor=True, sensor=1)),
+        ("body", dict(radius=0.15, pos=(0.5, 0.5), density=0, isSensor=True, sensor=2)),
+        # Legs
+        ("lleg", dict(box=(0.3, 0.15), density=1, friction=0.3)),
+        ("rleg", dict(box=(0.3, 0.15), density=1, friction=0.3)),
+        # Feet, with ground/foot sensors
+        ("lfoot", dict(box=(0.36, 0.08), density=1, friction=0.3)),
+        ("lfoot", dict(radius=0.15, pos=(-0.36, 0), density=1, friction=1.0, restitution=0.0, sensor=0)),
+        ("rfoot", dict(box=(0.36, 0.08), density=1, friction=0.3)),
+        ("rfoot", dict(radius=0.15, pos=(0.36, 0), density=1, friction=1.0, restitution=0.0, sensor=3)),
+    ],
+    joints = [
+        ("lleg", "lfoot", (-0.3, 0), (0.36, 0), 10.0),
+        ("body", "lleg", (-0.4, -0.45), (0.3, 0), 20.0),
+        ("body", "rleg", (0.4, -0.45), (-0.3, 0), 20.0),
+        ("rleg", "rfoot", (0.3, 0), (-0.36, 0), 10.0),
+    ],
+    gains = [20.0] * 4,
+    mirror_gains = [-20.0] * 4,
+    body_angle = False,
+)
+
+
+# Same as Cubotron1000 but with a body angle sensor
+CUBOTRON1001 = dict(CUBOTRON1000, body_angle=True)
+
+
+# Same as Cubotron1001 but with super weak motors
+WEAKOTRON1001 = dict(
+    CUBOTRON1001,
+    joints = [
+        ("lleg", "lfoot", (-0.3, 0), (0.36, 0), 5.0),
+        ("body", "lleg", (-0.4, -0.45), (0.3, 0), 10.0),
+        ("body", "rleg", (0.4, -0.45), (-0.3, 0), 10.0),
+        ("rleg", "rfoot", (0.3, 0), (-0.36, 0), 5.0),
+    ],
+    gains = [-3.0] * 4,
+    mirror_gains = [-3.0] * 4,
+)
+
+
+BOULOTRON2000 = dict(
+    #     (0)---X(1)-----x-----(2) [[[ BODY ]]] (3)-----x-----(4)X---(5)
+    fixtures = [
+        ("body", dict(radius=0.6, pos=(0.0, 0.0), density=1.0)),
+        ## Ground/Body sensors
+        ("body", dict(radius=0.15, pos=(-0.58, -0.1), density=0, isSensor=True, sensor=2)),
+        ("body", dict(radius=0.15, pos=(0.58, -0.1), density=0, isSensor=True, sensor=3)),
+        # Thighs
+        ("lthigh", dict(box=(0.3, 0.15), density=1, friction=0.3, groupIndex=-1)),
+        ("rthigh", dict(box=(0.3, 0.15), density=1, friction=0.3, groupIndex=-1)),
+        # Legs
+        ("lleg", dict(box=(0.36, 0.1), density=1, friction=0.3, groupIndex=-1)),
+        ("rleg", dict(box=(0.36, 0.1), density=1, friction=0.3, groupIndex=-1)),
+        ## Heel sensors
+        ("lleg", dict(radius=0.15, pos=(-0.36, 0), density=1, friction=1.0, restitution=0.0, groupIndex=-1, sensor=1)),
+        ("rleg", dict(radius=0.15, pos=(0.36, 0), density=1, friction=1.0, restitution=0.0, groupIndex=-1, sensor=4)),
+        # Feet
+        ("lfoot", dict(box=(0.2, 0.08), density=1, friction=0.3, groupIndex=-1)),
+        ("rfoot", dict(box=(0.2, 0.08), density=1, friction=0.3, groupIndex=-1)),
+        ## Feet sensors
+        ("lfoot", dict(radius=0.15, pos=(-0.2, 0), density=1, friction=1.0, restitution=0.0, groupIndex=-1, sensor=0)),
+        ("rfoot", dict(radius=0.15, pos=(0.2, 0), density=1, friction=1.0, restitution=0.0, groupIndex=-1, sensor=5)),
+    ],
+    joints = [
+        ("lleg", "lfoot", (-0.36, 0), (0.2, 0), 10.0),
+        ("lthigh", "lleg", (-0.3, 0), (0.36, 0), 10.0),
+        ("body", "lthigh", (0.0, -0.55), (0.3, 0), 20.0),
+        ("body", "rthigh", (0.0, -0.55), (-0.3, 0), 20.0),
+        ("rthigh", "rleg", (0.3, 0), (-0.36, 0), 10.0),
+        ("rleg", "rfoot", (0.36, 0), (-0.2, 0), 10.0),
+    ],
+    gains = [-5.0, -15.0, -15.0, -15.0, -15.0, -5.0],
+    mirror_gains = [-5.0, -15.0, -15.0, -15.0, -15.0, -5.0],
+    body_angle = True,
+)
+
+
+BOULOTRON2001 = dict(
+    #     (0)---X(1)-----x-----(2) [[[ BODY ]]] (3)-----x-----(4)X---(5)
+    fixtures = [
+        ("body", dict(radius=0.6, pos=(0.0, 0.0), density=0.5)),
+        ## Ground/Body sensors
+        ("body", dict(radius=0.15, pos=(-0.58, -0.1), density=0, isSensor=True, sensor=2)),
+        ("body", dict(radius=0.15, pos=(0.58, -0.1), density=0, isSensor=True, sensor=3)),
+        # Thighs
+        ("lthigh", dict(box=(0.3, 0.15), density=1, friction=0.3, groupIndex=-1)),
+        ("rthigh", dict(box=(0.3, 0.15), density=1, friction=0.3, groupIndex=-1)),
+        # Legs
+        ("lleg", dict(box=(0.36, 0.1), density=1, friction=0.3, groupIndex=-1)),
+        ("rleg", dict(box=(0.36, 0.1), density=1, friction=0.3, groupIndex=-1)),
+        ## Heel sensors
+        ("lleg", dict(radius=0.15, pos=(-0.36, 0), density=1, friction=1.0, restitution=0.0, groupIndex=-1, sensor=1)),
+        ("rleg", dict(radius=0.15, pos=(0.36, 0), density=1, friction=1.0, restitution=0.0, groupIndex=-1, sensor=4)),
+        # Feet
+        ("lfoot", dict(box=(0.1, 0.08), density=1, friction=0.3, groupIndex=-1)),
+        ("rfoot", dict(box=(0.1, 0.08), density=1, friction=0.3, groupIndex=-1)),
+        ## Feet sensors
+        ("lfoot", dict(radius=0.15, pos=(-0.1, 0), density=1, friction=1.0, restitution=0.0, groupIndex=-1, sensor=0)),
+        ("rfoot", dict(radius=0.15, pos=(0.1, 0), density=1, friction=1.0, restitution=0.0, groupIndex=-1, sensor=5)),
+    ],
+    joints = [
+        ("lleg", "lfoot", (-0.36, 0), (0.2, 0), 10.0),
+        ("lthigh", "lleg", (-0.3, 0), (0.36, 0), 10.0),
+        ("body", "lthigh", (-0.35, -0.4), (0.3, 0), 20.0),
+        ("body", "rthigh", (0.35, -0.4), (-0.3, 0), 20.0),
+        ("rthigh", "rleg", (0.3, 0), (-0.36, 0), 10.0),
+        ("rleg", "rfoot", (0.36, 0), (-0.2, 0), 10.0),
+    ],
+    gains = [-2.0, -5.0, -8.0, -8.0, -5.0, -2.0],
+    mirror_gains = [-2.0, -5.0, -8.0, -8.0, -5.0, -2.0],
+    body_angle = True,
+)
+
+
+
+MORPHOLOGIES = {
+    "Cubotron1000": CUBOTRON1000,
+    "Cubotron1001": CUBOTRON1001,
+    "Weakotron1001": WEAKOTRON1001,
+    "Boulotron2000": BOULOTRON2000,
+    "Boulotron2001": BOULOTRON2001,
+}
@@ -5,122 +5,200 @@
 import numpy as np
 from Box2D.b2 import contactListener
 from parameters import *
-from creatures import Animatronic
+from terrain import GROUND_TAG
 
 
 
 class nnContactListener(contactListener):
-    def __init__(self):
+    """
+        Contact sensors of every creature in a world
+        
+        Fixtures are tagged with integers (their userData, see get_tag):
+        GROUND_TAG for the ground, and for a creature's fixture its sensor
+        row times stride plus its column. Each creature is given a row of
+        self.sensors, which holds its contact sensor values, and in its
+        last column whether its body touches the ground.
+        Contacts are counted, so a sensor touching two pieces of ground
+        is only cleared when both contacts end.
+    """
+    
+    def __init__(self, capacity=16, max_sensors=15):
         contactListener.__init__(self)
-        self.sensors = dict()
+        self.width = max_sensors + 1
+        self.stride = self.width + 1    # Last column is for untracked fixtures
+        self.sensors = np.zeros((capacity, self.width))
+        self.counts = np.zeros((capacity, self.width), dtype=int)
+        self.owners = [None] * capacity
+        self.free_rows = list(range(capacity-1, -1, -1))
     
     def BeginContact(self, contact):
-        f1, f2 = contact.fixtureA, contact.fixtureB
-        if "ground" in (f1.userData, f2.userData):
-            if isinstance(f1.userData, tuple):	
-                # This fixture is an Animatronic sensor
-                self.sensors[f1.userData[0]][f1.userData[1]] = 1.0
-            elif isinstance(f1.userData, Animatronic):
-                # Detect body touching ground
-                if f1 == f1.userData.body.fixtures[0]:
-                    self.sensors[f1.userData.id][-1] = True
-            
-            if isinstance(f2.userData, tuple):
-                # This fixture is an Animatronic sensor
-                self.sensors[f2.userData[0]][f2.userData[1]] = 1.0
-            elif isinstance(f2.userData, Animatronic):
-                # Detect body touching ground
-                if f2 == f2.userData.body.fixtures[0]:
-                    self.sensors[f2.userData.id][-1] = True
+        tag1, tag2 = contact.fixtureA.userData, contact.fixtureB.userData
+        if tag1 == GROUND_TAG:
+            tag = tag2
+        elif tag2 == GROUND_TAG:
+            tag = tag1
+        else:
+            return
+        if tag is not None:
+            row, column = divmod(tag, self.stride)
+            if column < self.width:
+                self.counts[row, column] += 1
+                self.sensors[row, column] = 1.0
     
     def EndContact(self, contact):
-        f1, f2 = contact.fixtureA, contact.fixtureB
-        if "ground" in (f1.userData, f2.userData):
-            if isinstance(f1.userData, tuple):
-                # This fixture is an Animatronic sensor
-                self.sensors[f1.userData[0]][f1.userData[1]] = 0.0
-            elif isinstance(f1.userData, Animatronic):
-                # Detect body touching ground
-                if f1 == f1.userData.body.fixtures[0]:
-                    self.sensors[f1.userData.id][-1] = False
+        tag1, tag2 = contact.fixtureA.userData, contact.fixtureB.userData
+        if tag1 == GROUND_TAG:
+            tag = tag2
+        elif tag2 == GROUND_TAG:
+            tag = tag1
+        else:
+            return
+        if tag is not None:
+            row, column = divmod(tag, self.stride)
+            if column < self.width:
+                self.counts[row, column] -= 1
+                if self.counts[row, column] == 0:
+                    self.sensors[row, column] = 0.0
+    
+    def registerSensors(self, creature):
+        """ Returns the row of self.sensors given to a creature """
+        assert creature.n_contact_sensors < self.width, f"Can't track more than {self.width-1} sensors"
+        if not self.free_rows:
+            # Double the capacity
+            capacity = len(self.owners)
+            self.sensors = np.concatenate((self.sensors, np.zeros_like(self.sensors)))
+            self.counts = np.concatenate((self.counts, np.zeros_like(self.counts)))
+            self.owners.extend([None] * capacity)
+            self.free_rows = list(range(2*capacity-1, capacity-1, -1))
+        row = self.free_rows.pop()
+        self.owners[row] = creature
+        return row
+    
+    def unregisterSensors(self, row):
+        self.clearSensors(row)
+        self.owners[row] = None
+        self.free_rows.append(row)
+    
+    def clearSensors(self, row):
+        self.sensors[row] = 0.0
+        self.counts[row] = 0
+    
+    def get_tag(self, row, column=None):
+        """ Tag of a creature's fixture
             
-            if isinstance(f2.userData, tuple):
-                # This fixture is an Animatronic sensor
-                self.sensors[f2.userData[0]][f2.userData[1]] = 0.0
-            elif isinstance(f2.userData, Animatronic) and f2.userData.body.fixtures: # Weird
-                # Detect body touching ground
-                if f2 == f2.userData.body.fixtures[0]:
-                    self.sensors[f2.userData.id][-1] = False
-    
-    def registerSensors(self, id, n):
-        """
             Args:
-                id: Animatronic unique identifier
-                n: number of sensor to register
+                column: contact sensor number, -1 for the fixture telling
+                        if the body touches the ground, None if untracked
         """
-        self.sensors[id] = [0.0]*(n+1)  # Last slot for body touching ground
+        if column is None:
+            column = self.width
+        elif column < 0:
+            column = self.width - 1
+        return row * self.stride + column
+    
+    def get_owner(self, tag):
+        """ Returns the creature of a fixture tag, None for the ground """
+        if tag is None or tag == GROUND_TAG:
+            return None
+        return self.owners[tag // self.stride]
     
-    def unregisterSensors(self, id):
-        del self.sensors[id]
+    def get_sensor(self, tag):
+        """ Returns the value of a contact sensor's fixture tag,
+            None if the fixture is not a contact sensor
+        """
+        if tag is None or tag == GROUND_TAG:
+            return None
+        row, column = divmod(tag, self.stride)
+        if column >= self.width - 1:
+            return None
+        return self.sensors[row, column]
 
 
 
-def breed(creatures):
-    # This function is weird...
-    if len(creatures) < 2:
-        return []
+def breed(networks, n_children, genes=False, rng=None):
+    """
+        Produce children from random pairs of distinct parents, in bulk
+        
+        Args:
+            networks: neural networks of the parents, of the same architecture
+            n_children: number of children to produce
+            genes: inherit whole genes (see cross2) instead of single weights
+            rng: numpy.random.Generator
+        
+        Returns a list of new neural networks
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    n_parents = len(networks)
+    if n_parents < 2:
+        return [networks[0].copy() for i in range(n_children)]
+    assert BatchedNeuralNetwork.is_compatible(networks), "neural network architectures are different"
+    
+    parents1 = rng.integers(n_parents, size=n_children)
+    parents2 = (parents1 + rng.integers(1, n_parents, size=n_children)) % n_parents
+    children = [[] for i in range(n_children)]
+    for l in range(len(networks[0].weights)):
+        stacked = np.stack([nn.weights[l] for nn in networks])
+        rows, columns = stacked.shape[1:]
+        if genes:
+            mask = rng.random((n_children, 1, columns)) < 0.5
+        else:
+            mask = rng.random((n_children, rows, columns)) < 0.5
+        crossed = np.where(mask, stacked[parents1], stacked[parents2])
+        for child, w in zip(children, crossed):
+            child.append(w)
+    
     offspring = []
-    p1 = creatures[0]
-    for p2 in creatures[1:]:
-        offspring.append(p1.breed(p2))
-    return offspring + breed(creatures[1:])
+    for weights in children:
+        nn = NeuralNetwork()
+        nn.weights = weights
+        nn.set_activation(networks[0].activation)
+        offspring.append(nn)
+    return offspring
 
 
 
-def cross(array1, array2):
+def cross(array1, array2, rng=None):
+    """ Every weight is inherited from one parent or the other """
     assert(array1.shape == array2.shape)
-    new_list = []
-    a1, a2 = array1.flat, array2.flat
-    for i in range(array1.size):
-        r = np.random.randint(2)
-        if r == 0:
-            # inherit from first parent
-            new_list.append(a1[i])
-        if r == 1:
-            # inherit from second parent
-            new_list.append(a2[i])
-    return np.array(new_list).reshape(array1.shape)
-
-
-def cross2(array1, array2):
-    """ Cross function with whole genes instead of single nucleotides """
+    if rng is None:
+        rng = np.random.default_rng()
+    mask = rng.random(array1.shape) < 0.5
+    return np.where(mask, array1, array2)
+
+
+def cross2(array1, array2, rng=None):
+    """ Cross function with whole genes instead of single nucleotides
+        A gene is a column, the weights of every synapse reaching a neuron
+    """
     assert(array1.shape == array2.shape)
-    new_array = np.zeros_like(array1)
-    #a1, a2 = array1.flat, array2.flat
-    for i in range(array1.shape[1]):
-        r = np.random.randint(2)
-        if r == 0:
-            # inherit from first parent
-            new_array[:,i] = array1[:,i].copy()
-        if r == 1:
-            # inherit from second parent
-            new_array[:,i] = array2[:,i].copy()    
-    return new_array
+    if rng is None:
+        rng = np.random.default_rng()
+    mask = rng.random(array1.shape[1]) < 0.5
+    return np.where(mask, array1, array2)
 
 
 
-def sigmoid(x):
-    return 1 / (1+np.exp(-x))
+# Activation functions write their result in `out` when it is given,
+# so the neural network can reuse its buffers
+
+def sigmoid(x, out=None):
+    # Same as 1 / (1+exp(-x)), without overflowing for large negative x
+    out = np.multiply(x, 0.5, out=out)
+    np.tanh(out, out=out)
+    out += 1.0
+    out *= 0.5
+    return out
     
-def tanh(x):
+def tanh(x, out=None):
     # Better than sigmoid for our purpose
-    return (np.exp(x)-np.exp(-x)) / (np.exp(x)+np.exp(-x))
+    return np.tanh(x, out=out)
     
-def relu(x):
-    return np.maximum(x, np.zeros_like(x))
+def relu(x, out=None):
+    return np.maximum(x, 0.0, out=out)
     
-def sigmoid_derivative(x):
-    return x*(1-x)
+def sigmoid_derivative(x, out=None):
+    return np.multiply(x, 1-x, out=out)
 
 
 
@@ -132,8 +210,13 @@ class NeuralNetwork:
     
     def __init__(self):
         self.save_state = False # Keep calculated values of neurons after feedforward for display purposes
+        self.buffers = None
+        self.mirror = None
+        self.mirror_weights = None
     
     def init_weights(self, layers):
+        self.buffers = None
+        self.mirror_weights = None
         self.weights = []
         for i in range(len(layers)-1):
             # Fill neural network with random values between -1 and 1
@@ -159,21 +242,83 @@ class NeuralNetwork:
     def get_total_synapses(self):
         return sum([w.size for w in self.weights])
     
-    def feedforward(self, x):
-        self.output = np.array(x+[1.0])   # Add the bias unit
-        if self.save_state:
-            self.state = []
-            self.state.append(self.output.copy())
-        
-        for i in range(0, len(self.weights)-1):
-            self.output = self.activation_f(np.dot(self.output, self.weights[i]))
-            self.output = np.append(self.output, 1.0)   # Add the bias unit
-            if self.save_state:
-                self.state.append(self.output.copy())
+    def get_flat_weights(self):
+        """ Every weight of the network in a single 1-D array """
+        return np.concatenate([w.ravel() for w in self.weights])
+    
+    def set_flat_weights(self, flat):
+        """ Copy values from a 1-D array as returned by get_flat_weights """
+        i = 0
+        for w in self.weights:
+            w.flat[:] = flat[i:i+w.size]
+            i += w.size
+        self.mirror_weights = None
+    
+    def init_buffers(self):
+        """ Allocate the values of every layer once and for all,
+            with the bias unit as the last value of input and hidden layers
+        """
+        layers = self.get_layers()
+        self.buffers = [np.ones(n+1) for n in layers[:-1]]
+        self.output = np.zeros(layers[-1])
+    
+    def get_mirror_weights(self, mirror):
+        """ Returns the weights used in mirror mode, computed once per genome
             
-        self.output = self.activation_f(np.dot(self.output, self.weights[-1]))
+            Mirror mode feeds the network with left and right swapped.
+            Instead of permuting inputs and outputs at every step, the rows
+            of the first weight matrix and the columns of the last one are
+            permuted, and the rows negated where an input changes sign.
+            Hidden layers are shared with the normal weights.
+            
+            Args:
+                mirror: (input_order, input_signs, output_order) arrays,
+                        the mirrored input i is input input_order[i] times
+                        input_signs[i], the mirrored output i is output
+                        output_order[i]
+        """
+        if self.mirror_weights is None or self.mirror is not mirror:
+            input_order, input_signs, output_order = mirror
+            weights = list(self.weights)
+            first = weights[0].copy()
+            first[input_order] = weights[0][:-1] * input_signs[:, None]
+            weights[0] = first
+            weights[-1] = weights[-1][:, output_order]
+            self.mirror = mirror
+            self.mirror_weights = weights
+        return self.mirror_weights
+    
+    def feedforward(self, x, mirror=None):
+        """
+            Args:
+                x: inputs
+                mirror: feed forward with the mirror weights for this mirror
+                        mapping (see get_mirror_weights), or None
+        """
+        if self.buffers is None:
+            self.init_buffers()
+        weights = self.weights if mirror is None else self.get_mirror_weights(mirror)
+        values = self.buffers
+        values[0][:-1] = x
+        for i in range(0, len(weights)-1):
+            layer = values[i+1][:-1]    # Leave the bias unit untouched
+            np.dot(values[i], weights[i], out=layer)
+            self.activation_f(layer, out=layer)
+        np.dot(values[-1], weights[-1], out=self.output)
+        self.activation_f(self.output, out=self.output)
+        
         if self.save_state:
-            self.state.append(self.output)
+            self.state = [v.copy() for v in values] + [self.output.copy()]
+    
+    def crossover(self, other, genes=False, rng=None):
+        """ Returns a child network, inheriting from this one and another """
+        child = NeuralNetwork()
+        if genes:
+            child.weights = [cross2(w1, w2, rng) for w1, w2 in zip(self.weights, other.weights)]
+        else:
+            child.weights = [cross(w1, w2, rng) for w1, w2 in zip(self.weights, other.weights)]
+        child.set_activation(self.activation)
+        return child
     
     def copy(self):
         new_nn = NeuralNetwork()
@@ -195,3 +340,81 @@ class NeuralNetwork:
         return diff
         
 
+
+
+
+class BatchedNeuralNetwork:
+    """
+        Same-shaped neural networks stacked together, so a whole population
+        can be fed forward with one matrix product per layer
+    """
+    
+    def __init__(self, networks, mirrors=None):
+        """
+            Args:
+                mirrors: mirror mapping of every network
+                         (see NeuralNetwork.get_mirror_weights),
+                         needed to feed networks forward in mirror mode
+        """
+        assert self.is_compatible(networks), "neural network architectures are different"
+        self.size = len(networks)
+        self.layers = networks[0].get_layers()
+        # One (size × inputs+1 × outputs) tensor per layer
+        self.weights = [np.stack([nn.weights[i] for nn in networks])
+                        for i in range(len(self.layers)-1)]
+        self.activation = networks[0].activation
+        self.activation_f = NeuralNetwork.activations[self.activation]
+        self.networks = list(networks)
+        self.mirrors = mirrors
+        self.mirror_weights = None
+        # Input of every layer, one row per network,
+        # the last column is the bias unit and stays at 1
+        self.inputs = [np.ones((self.size, 1, n+1)) for n in self.layers[:-1]]
+    
+    @staticmethod
+    def is_compatible(networks):
+        if not networks:
+            return False
+        layers = networks[0].get_layers()
+        activation = networks[0].activation
+        return all(nn.get_layers() == layers and nn.activation == activation
+                   for nn in networks)
+    
+    def get_weights(self, mirrored):
+        """ Returns the weights of every layer, with the mirror weights
+            of mirrored networks
+            
+            Args:
+                mirrored: list of booleans, one per network
+        """
+        if not any(mirrored):
+            return self.weights
+        if self.mirror_weights is None:
+            # Only the first and last layers differ
+            last = len(self.weights)-1
+            self.mirror_weights = [
+                np.stack([nn.get_mirror_weights(m)[i] for nn, m in zip(self.networks, self.mirrors)])
+                if i in (0, last) else w
+                for i, w in enumerate(self.weights)]
+        if all(mirrored):
+            return self.mirror_weights
+        mask = np.array(mirrored)[:, None, None]
+        return [w if m is w else np.where(mask, m, w)
+                for w, m in zip(self.weights, self.mirror_weights)]
+    
+    def feedforward(self, x=None, mirrored=None):
+        """
+            Args:
+                x: inputs, one row per network, or None if they were
+                   already written in self.inputs[0]
+                mirrored: list of booleans, one per network, True to feed it
+                          forward with its mirror weights
+            
+            Outputs are stored in self.output, one row per network
+        """
+        if x is not None:
+            self.inputs[0][:, 0, :-1] = x
+        weights = self.weights if mirrored is None else self.get_weights(mirrored)
+        for i in range(0, len(weights)-1):
+            self.inputs[i+1][:, :, :-1] = self.activation_f(np.matmul(self.inputs[i], weights[i]))
+        self.output = self.activation_f(np.matmul(self.inputs[-1], weights[-1]))[:, 0]
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Novelty search: how far the behaviour of a creature is from the
+    behaviours already seen, as the mean distance to its k nearest
+    neighbours among an archive of past behaviours and the rest of its
+    generation
+
+    A behaviour is a fixed-length descriptor of a trial, the positions of
+    the creature's body sampled every few steps (see simulation.Trial).
+"""
+
+import numpy as np
+
+
+
+class KDTree:
+    """ Static k-d tree over a set of points, answering k nearest neighbour
+        distance queries without looking at every point
+
+        Nodes split their points at the median of the dimension they spread
+        the most along, down to leaves of at most leaf_size points, which
+        are scanned at once with numpy.
+    """
+
+    def __init__(self, points, leaf_size=256):
+        self.points = np.asarray(points, dtype=float)
+        self.leaf_size = max(1, leaf_size)
+        # Node i holds the points order[starts[i]:ends[i]], split along
+        # dimension dims[i] at value splits[i] between children lefts[i]
+        # and rights[i] (-1 for leaves)
+        self.order = np.arange(len(self.points))
+        self.starts, self.ends = [], []
+        self.dims, self.splits = [], []
+        self.lefts, self.rights = [], []
+        if len(self.points):
+            self._build(0, len(self.points))
+        # Points of every leaf stored contiguously
+        self.sorted_points = self.points[self.order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _new_node(self, start, end):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.dims.append(-1)
+        self.splits.append(0.0)
+        self.lefts.append(-1)
+        self.rights.append(-1)
+        return len(self.starts) - 1
+
+    def _build(self, start, end):
+        root = self._new_node(start, end)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            start, end = self.starts[node], self.ends[node]
+            if end - start <= self.leaf_size:
+                continue
+            indices = self.order[start:end]
+            values = self.points[indices]
+            spread = values.max(axis=0) - values.min(axis=0)
+            dim = int(np.argmax(spread))
+            if spread[dim] == 0:
+                continue    # Identical points
+            middle = (end - start) // 2
+            part = np.argpartition(values[:, dim], middle)
+            self.order[start:end] = indices[part]
+            self.dims[node] = dim
+            self.splits[node] = float(values[part[middle], dim])
+            self.lefts[node] = self._new_node(start, start + middle)
+            self.rights[node] = self._new_node(start + middle, end)
+            stack.append(self.lefts[node])
+            stack.append(self.rights[node])
+
+    def query(self, x, k, best=None):
+        """ Squared distances from x to its k nearest points, sorted
+
+            Args:
+                best: squared distances to other candidates, the result is
+                      the k smallest of those and of the tree's
+        """
+        x = np.asarray(x, dtype=float)
+        best = np.full(k, np.inf) if best is None else np.sort(best)[:k]
+        if len(best) < k:
+            best = np.concatenate([best, np.full(k - len(best), np.inf)])
+        worst = best[-1]
+        if not self.starts:
+            return best
+        # Node, lower bound of the squared distance to its points, and
+        # distance from x to the node's cell along every dimension
+        stack = [(0, 0.0, np.zeros(len(x)))]
+        while stack:
+            node, bound, offsets = stack.pop()
+            if bound >= worst:
+                continue
+            left = self.lefts[node]
+            if left < 0:
+                d2 = self.sorted_points[self.starts[node]:self.ends[node]] - x
+                d2 = np.einsum('ij,ij->i', d2, d2)
+                if len(d2) and d2.min() < worst:
+                    best = np.partition(np.concatenate([best, d2]), k-1)[:k]
+                    best.sort()
+                    worst = best[-1]
+                continue
+            dim = self.dims[node]
+            diff = x[dim] - self.splits[node]
+            near, far = (left, self.rights[node]) if diff < 0 else (self.rights[node], left)
+            # The far side is visited last, once the near one has narrowed worst
+            far_offsets = offsets.copy()
+            far_offsets[dim] = diff
+            stack.append((far, bound - offsets[dim]**2 + diff*diff, far_offsets))
+            stack.append((near, bound, offsets))
+        return best
+
+
+
+class NoveltyArchive:
+    """ Bounded archive of behaviours, indexed by k-d trees
+
+        New behaviours are scanned linearly until there are `min_pending`
+        of them, then put in a new tree. Trees are merged as soon as one is
+        more than half the size of the one before (logarithmic method): the
+        archive is split into a logarithmic number of trees, each point is
+        moved into a new tree a logarithmic number of times, and a lookup
+        never scans more than min_pending points.
+        Past `size` behaviours, the oldest ones are forgotten, a quarter of
+        the archive at a time.
+    """
+
+    def __init__(self, size=5000, k=15, leaf_size=256, min_pending=256):
+        """
+            Args:
+                size: number of behaviours kept
+                k: number of nearest neighbours of the novelty score
+        """
+        self.size = size
+        self.k = k
+        self.leaf_size = leaf_size
+        self.min_pending = min_pending
+        self.trees = []     # Oldest behaviours first
+        self.pending = []
+
+    def __len__(self):
+        return sum([len(tree) for tree in self.trees]) + len(self.pending)
+
+    def add(self, behaviours):
+        """ Add behaviours to the archive """
+        self.pending.extend([np.asarray(b, dtype=float) for b in behaviours])
+        if len(self.pending) < self.min_pending:
+            return
+        points = np.array(self.pending)
+        self.pending = []
+        while self.trees and 2*len(points) > len(self.trees[-1]):
+            points = np.concatenate([self.trees.pop().points, points])
+        self.trees.append(KDTree(points, self.leaf_size))
+        excess = len(self) - self.size
+        if excess > self.size // 4:
+            self.forget(excess)
+
+    def forget(self, n):
+        """ Drop the n oldest behaviours """
+        while self.trees and n >= len(self.trees[0]):
+            n -= len(self.trees.pop(0))
+        if self.trees and n > 0:
+            self.trees[0] = KDTree(self.trees[0].points[n:], self.leaf_size)
+
+    def nearest(self, x, k, best=None):
+        """ Squared distances from x to its k nearest archived behaviours,
+            or to other candidates given as in KDTree.query
+        """
+        if self.pending:
+            d2 = np.array(self.pending) - x
+            d2 = np.einsum('ij,ij->i', d2, d2)
+            best = d2 if best is None else np.concatenate([best, d2])
+        if not self.trees:
+            return KDTree(np.empty((0, len(x)))).query(x, k, best)
+        for tree in self.trees:
+            best = tree.query(x, k, best)
+        return best
+
+    def novelty(self, behaviours):
+        """ Novelty of each behaviour of a generation: mean distance to its
+            k nearest neighbours among the archive and the other behaviours
+        """
+        behaviours = np.asarray(behaviours, dtype=float)
+        # Generations are small, distances between them are computed at once
+        diff = behaviours[:, None, :] - behaviours[None, :, :]
+        others = np.einsum('ijk,ijk->ij', diff, diff)
+        np.fill_diagonal(others, np.inf)
+        k = min(self.k, len(self) + len(behaviours) - 1)
+        if k < 1:
+            return np.zeros(len(behaviours))
+        novelty = np.empty(len(behaviours))
+        for i, b in enumerate(behaviours):
+            best = np.partition(others[i], k-1)[:k] if k < len(others[i]) else others[i]
+            novelty[i] = np.mean(np.sqrt(self.nearest(b, k, best)))
+        return novelty
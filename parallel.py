@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import queue
+from math import inf
+import simulation
+
+
+
+def run_trials(genomes, terrain, limit_steps, batch_size=1, early_stop=(), cutoff=inf,
+               options=None):
+    """ Evaluate a slice of genomes on a given terrain
+
+        Args:
+            genomes: list of (morpho, neural network) tuples
+            terrain: Terrain object, as built by Evolve.build_ground
+            limit_steps: max number of steps for each trial
+            batch_size: number of creatures simulated together in one world
+            early_stop: early stop rules (see earlystop.py)
+            cutoff: score to beat to be selected
+            options: simulation.Evaluator arguments
+
+        Returns a list of (score, steps, aborted, behaviour) tuples, in the
+        same order as genomes, behaviour is None unless options has a
+        record_every value (see simulation.Trial.record)
+    """
+    options = options or {}
+    results = []
+    for i in range(0, len(genomes), batch_size):
+        trials = simulation.run_trials(genomes[i:i+batch_size], terrain, limit_steps,
+                                       early_stop, cutoff, **options)
+        results.extend([(t.score, t.steps, t.aborted, t.behaviour) for t in trials])
+    return results
+
+
+
+class ParallelEvaluator:
+    """ Spreads trials over a pool of warm worker processes
+        Each worker keeps its own simulation.Evaluator between generations
+        With 0 workers, trials are run in the calling process
+    """
+
+    def __init__(self, workers=0, batch_size=1, **options):
+        """
+            Args:
+                options: simulation.Evaluator arguments, for every worker
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self.options = options
+        self.processes = None
+        if workers > 0:
+            self.processes = multiprocessing.Pool(workers)
+        self.aborted = []
+        self.steps_saved = 0
+        self.behaviours = []
+        self.submitted = queue.SimpleQueue()   # Jobs done, see collect
+
+    def capacity(self):
+        """ Number of jobs to keep submitted so no worker waits for one """
+        return max(1, self.workers*2)
+
+    def submit(self, tag, genomes, terrain, limit_steps, early_stop=(), cutoff=inf):
+        """ Start the trials of up to batch_size genomes without waiting for
+            their results, which are returned by collect along with `tag`
+
+            Args:
+                cutoff: score to beat, for earlystop.BoundRule
+        """
+        args = (genomes, terrain, limit_steps, self.batch_size, early_stop, cutoff, self.options)
+        if self.processes:
+            self.processes.apply_async(run_trials, args,
+                                       callback=lambda r: self.submitted.put((tag, r, None)),
+                                       error_callback=lambda e: self.submitted.put((tag, None, e)))
+        else:
+            self.submitted.put((tag, run_trials(*args), None))
+
+    def collect(self):
+        """ Waits for the trials of a submitted job to end, returns its tag
+            and the list of (score, steps, aborted, behaviour) tuples of its
+            genomes (see run_trials)
+        """
+        tag, r, error = self.submitted.get()
+        if error is not None:
+            raise error
+        return tag, r
+
+    def evaluate(self, genomes, terrain, limit_steps, early_stop=(), cutoff=None):
+        """ Returns the scores of genomes
+
+            Args:
+                early_stop: early stop rules (see earlystop.py)
+                cutoff: earlystop.RunningCutoff, fed with the score of every
+                        trial that was not aborted and passed on to the
+                        rules of the next trials
+
+            Which trials were aborted is kept in self.aborted, the number
+            of steps they were spared in self.steps_saved, and the behaviour
+            of every genome in self.behaviours
+        """
+        if self.processes:
+            # Smaller slices than one per worker, so a worker done with a slice
+            # of quick trials can pick up another one.
+            # Slices are made of whole batches so every creature shares its world
+            # with the same neighbours whatever the number of workers
+            num_batches = -(-len(genomes) // self.batch_size)
+            slice_size = max(1, num_batches // (self.workers*4)) * self.batch_size
+        else:
+            slice_size = self.batch_size
+        slices = [(i, genomes[i:i+slice_size]) for i in range(0, len(genomes), slice_size)]
+        slices.reverse()
+
+        results = [None] * len(genomes)
+        done = queue.SimpleQueue()
+        in_flight = 0
+        while slices or in_flight:
+            # Keep every worker busy, with up-to-date cutoff values
+            while slices and (in_flight == 0 or in_flight < self.workers*2):
+                start, chunk = slices.pop()
+                args = (chunk, terrain, limit_steps, self.batch_size, early_stop,
+                        cutoff.value if cutoff else inf, self.options)
+                if self.processes:
+                    self.processes.apply_async(run_trials, args,
+                                               callback=lambda r, start=start: done.put((start, r)),
+                                               error_callback=lambda e: done.put((None, e)))
+                else:
+                    done.put((start, run_trials(*args)))
+                in_flight += 1
+            start, r = done.get()
+            in_flight -= 1
+            if start is None:
+                raise r
+            results[start:start+len(r)] = r
+            if cutoff:
+                # Aborted trials only have a pessimistic score
+                for score, steps, aborted, behaviour in r:
+                    if not aborted:
+                        cutoff.add(score)
+
+        self.aborted = [aborted for score, steps, aborted, behaviour in results]
+        self.steps_saved = sum([limit_steps-steps for score, steps, aborted, behaviour in results if aborted])
+        self.behaviours = [behaviour for score, steps, aborted, behaviour in results]
+        return [score for score, steps, aborted, behaviour in results]
+
+    def close(self):
+        if self.processes:
+            self.processes.close()
+            self.processes.join()
+            self.processes = None
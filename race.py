@@ -12,6 +12,8 @@ from nn import *
 import creatures
 from renderer import Camera
 from utils import *
+from simulation import CreatureGroup, PHYSICS
+from terrain import random_terrain, GROUND_TAG
 
 # Box2D.b2 maps Box2D.b2Vec2 to vec2 (and so on)
 from Box2D.b2 import (world, polygonShape, edgeShape, staticBody, dynamicBody, pi, vec2, queryCallback, AABB)
@@ -34,6 +36,7 @@ class Evolve:
         self.stats = Stats()
         
         self.speed_multiplier = 1.0
+        self.physics = PHYSICS[self.args.physics]
         
         # --- pygame setup ---
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
@@ -50,25 +53,18 @@ class Evolve:
     
     def build_ground(self):
         # A static body to hold the ground shape
-        elevation = 0
         if hasattr(self, 'ground'):
             self.world.DestroyBody(self.ground)
-        self.ground = self.world.CreateStaticBody()
         start_posx = round(STARTPOS[0])
         assert -50 < start_posx < 50, "Starting position should be between -50 and 50"
-        for x in range(-50, 100):
-            prev_elevation = elevation
-            elevation = prev_elevation + (random.random()-0.5) * self.args.terrain_roughness*0.01
-            self.ground.CreateEdgeFixture(vertices=[(x,prev_elevation), (x+1,elevation)],
+        self.terrain = random_terrain(self.args.terrain_roughness, length=150)
+        self.ground = self.terrain.build(self.world)
+        x, elevation = self.terrain.vertices[-1]
+        self.ground.CreateEdgeFixture(vertices=[(x,elevation), (x,50)],
                                               friction=1.0,
-                                              userData='ground')
-            if x == start_posx:
-                self.startpos_elevation = prev_elevation
-            elif abs(self.target.x-x) < 0.5:
-                self.camera.set_pole(self.target.x, prev_elevation)
-        self.ground.CreateEdgeFixture(vertices=[(x+1,elevation), (x+1,50)],
-                                              friction=1.0,
-                                              userData='ground')
+                                              userData=GROUND_TAG)
+        self.startpos_elevation = self.terrain.get_elevation(start_posx)
+        self.camera.set_pole(self.target.x, self.terrain.get_elevation(self.target.x))
 
 
     def load_population(self, filename):
@@ -133,8 +129,10 @@ class Evolve:
     def mainLoop(self):
         podium = []
         creatures = self.next_runners()
+        group = CreatureGroup(creatures)
         self.camera.follow(creatures[0])
         steps = 0
+        control_steps = 0   # Physics steps since the start of the race
         mirror = False
         mouse_drag = False
         paused = False
@@ -176,6 +174,7 @@ class Evolve:
                         paused = not paused
                     elif event.key == K_n:  # Next batch
                         steps = 0
+                        control_steps = 0
                         self.camera.set_center(vec2(0, 0))
                         self.build_ground()
                         for c in creatures:
@@ -183,31 +182,35 @@ class Evolve:
                         creatures = self.next_runners()
                         if not creatures:
                             running = False
+                        group = CreatureGroup(creatures)
                 elif event.type == QUIT:
                     running = False
             
             if not paused:
-                for c in creatures:
-                    c.update(self.world.contactListener.sensors[c.id][:-1], mirror)
+                if control_steps % self.args.control_every == 0:
+                    group.update(self.world.contactListener.sensors, mirror)
+                control_steps += 1
             
             #### PyGame ####
             self.camera.render()
             pygame.display.flip()
-            self.clock.tick(TARGET_FPS)
+            self.clock.tick(TARGET_FPS / self.physics.frames)
             
             if paused:
                 continue
             
-            self.world.Step(TIME_STEP*self.speed_multiplier, 6, 2)
-            steps += 1 * self.speed_multiplier
+            self.physics.step(self.world, self.speed_multiplier)
+            steps += self.physics.frames * self.speed_multiplier
             if steps >= self.args.limit_steps:
                 # End of trial for this creature
                 steps = 0
+                control_steps = 0
                 for c in creatures:
                     c.destroy()
 
                 if len(self.pool) > 0:
                     creatures = self.next_runners()
+                    group = CreatureGroup(creatures)
                 else:
                     running = False
 
@@ -220,6 +223,8 @@ def parseInputs():
     parser.add_argument('-l', '--limit_steps', type=int, default=3000, help='max number of steps for each individual trial (defaults to 500)')
     parser.add_argument('-n', '--num-participants', type=int, default=4, help='')
     parser.add_argument('-p', '--pool_size', type=int, default=200, help='size of creature population (defaults to 200)')
+    parser.add_argument('--control_every', type=int, default=1, help='feed neural networks forward once every X physics steps, holding motor speeds in between (defaults to 1, every step)')
+    parser.add_argument('--physics', choices=list(PHYSICS), default='default', help='physics fidelity profile: timestep, solver iterations and substeps (defaults to "default", 60 Hz with 6 velocity and 2 position iterations)')
     return parser.parse_args()
 
 
@@ -227,6 +232,7 @@ if __name__ == "__main__":
     args = parseInputs()
     args.terrain_roughness = max(0, args.terrain_roughness)
     args.limit_steps = max(50, args.limit_steps)
+    args.control_every = max(1, args.control_every)
     
     evolve = Evolve(args)
     print("Parameters :")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from math import inf, sqrt
+from statistics import NormalDist
+import numpy as np
+
+
+
+class Race:
+    """ Selection of the best candidates of a pool, scored on a common
+        sequence of terrains (lower scores are better)
+
+        Every candidate is scored on the first terrain, and only the ones
+        that can't yet be told apart from the selection cutoff are scored
+        on the next terrains, one at a time: the n-th score of a candidate
+        always comes from the n-th terrain.
+
+        Terrains aren't equally hard, so a candidate's score is the mean of
+        its scores minus the difficulty of each terrain, as measured by the
+        candidates scored on both that terrain and the first one.
+        The spread of a candidate's scores from one terrain to another is
+        assumed to be the same for every candidate, and is estimated from
+        all candidates scored on several terrains.
+    """
+
+    def __init__(self, size, winners, max_terrains, confidence=0.9):
+        """
+            Args:
+                size: number of candidates
+                winners: number of candidates selected
+                max_terrains: length of the sequence of terrains
+                confidence: of the interval around a candidate's score
+                            that must not contain the cutoff
+        """
+        self.winners = winners
+        self.scores = np.full((size, max_terrains), np.nan)
+        self.counts = np.zeros(size, dtype=int)
+        self.z = NormalDist().inv_cdf(0.5 + confidence/2)
+
+    def add(self, indices, scores):
+        """ Add the scores of the given candidates on their next terrain """
+        for i, score in zip(indices, scores):
+            self.scores[i, self.counts[i]] = score
+            self.counts[i] += 1
+
+    def difficulties(self):
+        """ Mean score difference of every terrain with the first one """
+        difficulties = np.zeros(self.scores.shape[1])
+        for n in range(1, len(difficulties)):
+            scored = self.counts > n
+            if scored.any():
+                difficulties[n] = np.mean(self.scores[scored, n] - self.scores[scored, 0])
+        return difficulties
+
+    def means(self):
+        """ Score of every candidate, on the first terrain's scale """
+        return np.nanmean(self.scores - self.difficulties(), axis=1)
+
+    def sigma(self):
+        """ Standard deviation of a score from one terrain to another,
+            inf if no candidate was scored twice yet
+        """
+        repeated = self.counts > 1
+        if not repeated.any():
+            return inf
+        adjusted = self.scores[repeated] - self.difficulties()
+        deviations = adjusted - np.nanmean(adjusted, axis=1)[:, None]
+        return sqrt(np.nansum(deviations**2) / np.sum(self.counts[repeated]-1))
+
+    def cutoff(self, means):
+        """ Score between the last selected candidate and the next one """
+        if self.winners >= len(means):
+            return inf
+        best = np.partition(means, self.winners)[:self.winners+1]
+        return (np.max(best[:-1]) + best[-1]) / 2
+
+    def undecided(self):
+        """ Candidates whose confidence interval contains the cutoff and
+            that have terrains left, most uncertain first
+        """
+        means = self.means()
+        margins = np.abs(means - self.cutoff(means))
+        sigma = self.sigma()
+        if sigma == inf:
+            # Nothing to go by but the distance to the cutoff
+            ratios = np.zeros(len(means))
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios = margins / (sigma / np.sqrt(self.counts))
+        candidates = np.flatnonzero((ratios < self.z) & (self.counts < self.scores.shape[1]))
+        order = np.lexsort((margins[candidates], ratios[candidates]))
+        return candidates[order].tolist()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Trials handed out over TCP to worker processes, on this machine or on
+    others, which can join or leave at any time
+
+    The coordinator (RemoteEvaluator) posts jobs on a JobBoard, served with
+    multiprocessing.managers. Workers (see work) take jobs from the board,
+    run them with parallel.run_trials and post the results back.
+    A worker holds a lease on the jobs it took, renewed by a heartbeat;
+    the jobs of a worker that has not been heard of for a while are put
+    back in the queue for another one.
+
+    multiprocessing.managers unpickles what the other end sends, so the
+    coordinator and its workers must share a secret key, and the coordinator
+    only listens on this machine unless told otherwise.
+"""
+
+import os
+import socket
+import threading
+import time
+import multiprocessing
+from multiprocessing.managers import BaseManager
+from collections import deque
+from math import inf
+from parallel import run_trials
+
+
+PORT = 50000
+# Environment variable holding the key shared by the coordinator and workers
+AUTHKEY_VARIABLE = "NEURANIM_AUTHKEY"
+# Seconds without news from a worker before its jobs are given to others
+LEASE_TIMEOUT = 10.0
+
+
+
+class JobBoard:
+    """ Jobs waiting for a worker, jobs being run and their results
+        Shared between the coordinator and every worker connection
+    """
+
+    def __init__(self, timeout=LEASE_TIMEOUT):
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.waiting = deque()      # Ids of jobs waiting for a worker
+        self.jobs = dict()          # Arguments of jobs not done yet, by id
+        self.leases = dict()        # Worker running each job, by id
+        self.workers = dict()       # Time each worker was last heard of
+        self.results = deque()
+        self.requeued = 0
+        self.closed = False
+
+    def submit(self, job_id, args):
+        with self.condition:
+            self.jobs[job_id] = args
+            self.waiting.append(job_id)
+            self.condition.notify_all()
+
+    def take(self, worker, wait=1.0):
+        """ Returns a waiting (job id, arguments) pair and gives its lease to
+            the worker, None if there was none for `wait` seconds, or
+            False once the board is closed
+        """
+        deadline = time.monotonic() + wait
+        with self.condition:
+            self.workers[worker] = time.monotonic()
+            while not self.waiting and not self.closed:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+                self.condition.wait(left)
+            if self.closed:
+                return False
+            job_id = self.waiting.popleft()
+            self.leases[job_id] = worker
+            return job_id, self.jobs[job_id]
+
+    def heartbeat(self, worker):
+        with self.condition:
+            self.workers[worker] = time.monotonic()
+
+    def done(self, worker, job_id, result, error=None):
+        """ Post the result of a job, or the exception that interrupted it
+            Results of jobs that were already done by another worker are
+            dropped
+        """
+        with self.condition:
+            self.workers[worker] = time.monotonic()
+            if job_id not in self.jobs:
+                return
+            del self.jobs[job_id]
+            self.leases.pop(job_id, None)
+            if job_id in self.waiting:
+                self.waiting.remove(job_id)
+            self.results.append((job_id, result, error))
+            self.condition.notify_all()
+
+    def leave(self, worker):
+        """ Put the jobs of a worker back in the queue """
+        with self.condition:
+            self.workers.pop(worker, None)
+            self._requeue([j for j, w in self.leases.items() if w == worker])
+
+    def _requeue(self, job_ids):
+        for job_id in job_ids:
+            del self.leases[job_id]
+            self.waiting.appendleft(job_id)
+        self.requeued += len(job_ids)
+        if job_ids:
+            self.condition.notify_all()
+
+    def expire(self):
+        """ Forget workers that have not been heard of for too long,
+            and put their jobs back in the queue
+        """
+        now = time.monotonic()
+        with self.condition:
+            for worker, seen in list(self.workers.items()):
+                if now - seen > self.timeout:
+                    del self.workers[worker]
+            self._requeue([j for j, w in self.leases.items() if w not in self.workers])
+
+    def result(self, wait=1.0):
+        """ Returns a (job id, result, error) tuple, or None if no job was
+            done within `wait` seconds
+        """
+        with self.condition:
+            if not self.results:
+                self.condition.wait(wait)
+            if self.results:
+                return self.results.popleft()
+            return None
+
+    def cancel(self):
+        """ Drop every job not done yet """
+        with self.condition:
+            self.jobs.clear()
+            self.waiting.clear()
+            self.leases.clear()
+            self.results.clear()
+
+    def num_workers(self):
+        with self.condition:
+            return len(self.workers)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+
+class BoardManager(BaseManager):
+    pass
+
+BoardManager.register("board")
+
+
+class BoardServer(BaseManager):
+    """ Serves the JobBoard of a coordinator, see server_class """
+    pass
+
+
+def server_class(board):
+    """ BoardServer subclass serving the given board
+        Registrations are stored on the class, every coordinator needs its own
+    """
+    cls = type("BoardServer", (BoardServer,), {})
+    cls.register("board", callable=lambda: board)
+    return cls
+
+
+
+def connect(address, authkey, retry=30.0):
+    """ Returns a proxy of the coordinator's JobBoard, waiting up to `retry`
+        seconds for the coordinator to start
+    """
+    deadline = time.monotonic() + retry
+    while True:
+        manager = BoardManager(address, authkey)
+        try:
+            manager.connect()
+            return manager.board()
+        except (EOFError, ConnectionError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1.0)
+
+
+def parse_address(address, port=PORT):
+    """ (host, port) tuple from a "host" or "host:port" string """
+    host, _, p = address.partition(":")
+    return host, int(p) if p else port
+
+
+def work(address, authkey, name=None):
+    """ Run jobs of a coordinator until it closes its board or goes away """
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    try:
+        board = connect(address, authkey)
+    except (EOFError, ConnectionError):
+        print(f"Worker {name}: no coordinator at {address[0]}:{address[1]}")
+        return
+    except multiprocessing.AuthenticationError:
+        print(f"Worker {name}: the coordinator at {address[0]}:{address[1]} has another key")
+        return
+    stop = threading.Event()
+
+    def heartbeat():
+        # Own connection, as proxies can't be shared between threads
+        try:
+            beat = connect(address, authkey)
+            while not stop.wait(LEASE_TIMEOUT / 4):
+                beat.heartbeat(name)
+        except (EOFError, ConnectionError):
+            pass
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    done = 0
+    try:
+        while True:
+            job = board.take(name)
+            if job is False:
+                break
+            if job is None:
+                continue
+            job_id, args = job
+            try:
+                result = run_trials(*args)
+            except Exception as e:
+                board.done(name, job_id, None, repr(e))
+                continue
+            board.done(name, job_id, result)
+            done += 1
+    except (EOFError, ConnectionError):
+        pass    # The coordinator is gone
+    except KeyboardInterrupt:
+        try:
+            board.leave(name)
+        except (EOFError, ConnectionError):
+            pass
+    finally:
+        stop.set()
+    print(f"Worker {name}: {done} jobs done")
+
+
+
+class RemoteEvaluator:
+    """ Same as parallel.ParallelEvaluator, with trials run by workers
+        connected over TCP (see work)
+    """
+
+    def __init__(self, authkey, port=PORT, batch_size=1, local_workers=0, bind="localhost",
+                 **options):
+        """
+            Args:
+                authkey: secret key workers must know (bytes)
+                port: where workers connect to
+                local_workers: number of worker processes started on this
+                               machine
+                bind: address to listen on, "" for every interface
+                options: simulation.Evaluator arguments, for every worker
+        """
+        if not authkey:
+            raise ValueError("A secret key is needed to serve trials")
+        self.batch_size = batch_size
+        self.options = options
+        self.board = JobBoard()
+        self.next_id = 0
+        self.server = server_class(self.board)((bind, port), authkey).get_server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        local = bind if bind not in ("", "0.0.0.0") else "localhost"
+        self.local_workers = [multiprocessing.Process(target=work,
+                                                      args=((local, port), authkey))
+                              for i in range(local_workers)]
+        for p in self.local_workers:
+            p.start()
+        print(f"Serving trials on {bind or 'every interface'}, port {port}")
+        self.aborted = []
+        self.steps_saved = 0
+        self.behaviours = []
+        self.tags = dict()      # Tags of submitted jobs, by id
+        self.last_news = time.monotonic()
+
+    def capacity(self):
+        """ Number of jobs to keep submitted so no worker waits for one """
+        return max(1, self.board.num_workers())*2
+
+    def submit(self, tag, genomes, terrain, limit_steps, early_stop=(), cutoff=inf):
+        """ See parallel.ParallelEvaluator.submit """
+        args = (genomes, terrain, limit_steps, self.batch_size, early_stop, cutoff, self.options)
+        self.board.submit(self.next_id, args)
+        self.tags[self.next_id] = tag
+        self.next_id += 1
+
+    def collect(self):
+        """ See parallel.ParallelEvaluator.collect """
+        while True:
+            job_id, r = self.next_result()
+            if job_id in self.tags:
+                return self.tags.pop(job_id), r
+
+    def next_result(self):
+        """ Waits for a job to be done, returns its id and results """
+        while True:
+            self.board.expire()
+            done = self.board.result()
+            if done is None:
+                if time.monotonic() - self.last_news > 30:
+                    print(f"    Waiting for workers ({self.board.num_workers()} connected)")
+                    self.last_news = time.monotonic()
+                continue
+            self.last_news = time.monotonic()
+            job_id, r, error = done
+            if error:
+                self.board.cancel()
+                raise RuntimeError(f"Worker failed: {error}")
+            return job_id, r
+
+    def evaluate(self, genomes, terrain, limit_steps, early_stop=(), cutoff=None):
+        """ Returns the scores of genomes
+            See parallel.ParallelEvaluator.evaluate
+        """
+        # Slices are made of whole batches, small enough to be spread over
+        # workers that join during the evaluation
+        num_batches = -(-len(genomes) // self.batch_size)
+        slice_size = max(1, num_batches // 32) * self.batch_size
+        slices = [(i, genomes[i:i+slice_size]) for i in range(0, len(genomes), slice_size)]
+        slices.reverse()
+
+        results = [None] * len(genomes)
+        starts = dict()     # Start index of every job in flight, by id
+        while slices or starts:
+            # Keep every worker busy, with up-to-date cutoff values
+            while slices and len(starts) < self.capacity():
+                start, chunk = slices.pop()
+                args = (chunk, terrain, limit_steps, self.batch_size, early_stop,
+                        cutoff.value if cutoff else inf, self.options)
+                self.board.submit(self.next_id, args)
+                starts[self.next_id] = start
+                self.next_id += 1
+            job_id, r = self.next_result()
+            start = starts.pop(job_id)
+            results[start:start+len(r)] = r
+            if cutoff:
+                # Aborted trials only have a pessimistic score
+                for score, steps, aborted, behaviour in r:
+                    if not aborted:
+                        cutoff.add(score)
+
+        self.aborted = [aborted for score, steps, aborted, behaviour in results]
+        self.steps_saved = sum([limit_steps-steps for score, steps, aborted, behaviour in results if aborted])
+        self.behaviours = [behaviour for score, steps, aborted, behaviour in results]
+        return [score for score, steps, aborted, behaviour in results]
+
+    def close(self):
+        """ Tell workers to stop """
+        self.board.close()
+        for p in self.local_workers:
+            p.join()
+        if self.board.requeued:
+            print(f"{self.board.requeued} jobs were given to another worker")
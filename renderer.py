@@ -5,7 +5,7 @@
 from math import (floor, ceil)
 import pygame
 from Box2D.b2 import (world, polygonShape, staticBody, dynamicBody, pi, vec2, queryCallback, AABB)
-from creatures import Animatronic
+from terrain import GROUND_TAG
 
 
 
@@ -25,6 +25,7 @@ class Camera(queryCallback):
         self.aabb = AABB(lowerBound=self.center - (self.width/2, self.height/2),
                          upperBound=self.center + (self.width/2, self.height/2))
         self.creatures_in_view = set()
+        self.chain_drawn = False
         self.following = False
         self.draw_pole = False
         queryCallback.__init__(self)
@@ -33,20 +34,21 @@ class Camera(queryCallback):
     def ReportFixture(self, fixture):
         # Draw fixture
         shape = fixture.shape
+        creature = self.world.contactListener.get_owner(fixture.userData)
         
-        if isinstance(fixture.userData, Animatronic):
-            self.creatures_in_view.add(fixture.userData)
-        elif isinstance(fixture.userData, tuple):
-            pass
-        elif fixture.userData == 'ground' and shape.type == 1:
+        if creature is not None:
+            self.creatures_in_view.add(creature)
+        elif fixture.userData == GROUND_TAG and shape.type == 1:
             #Ground line
-            p0 = self.world_to_px(shape.vertices[0])
-            p1 = self.world_to_px(shape.vertices[1])
-            px_points = [(p0[0], p0[1]),
-                         (p1[0], p1[1]),
-                         (p1[0], self.screen_height),
-                         (p0[0], self.screen_height)]
-            pygame.draw.polygon(self.screen, (64, 64, 64, 255), px_points)
+            self.draw_ground(shape.vertices)
+        elif fixture.userData == GROUND_TAG and shape.type == 3:
+            # Ground chain, reported once for every edge in view
+            if not self.chain_drawn:
+                self.chain_drawn = True
+                left = self.center.x - self.width/2 - 1
+                right = self.center.x + self.width/2 + 1
+                vertices = [v for v in shape.vertices if left <= v[0] <= right]
+                self.draw_ground(vertices)
             
         else:
             if shape.type == 2:  # Polygon shape
@@ -65,6 +67,13 @@ class Camera(queryCallback):
         return True
     
     
+    def draw_ground(self, vertices):
+        px_points = [self.world_to_px(v) for v in vertices]
+        px_points.append((px_points[-1][0], self.screen_height))
+        px_points.append((px_points[0][0], self.screen_height))
+        pygame.draw.polygon(self.screen, (64, 64, 64, 255), px_points)
+    
+    
     def world_to_px(self, pos):
         """ Reverse height coordinates (up is positive in Box2D) """
         return (int((pos[0]-self.center.x)*self.HPPM)+self.screen_width//2,
@@ -98,9 +107,10 @@ class Camera(queryCallback):
                     vertices = [self.world_to_px(f.body.transform * v) for v in f.shape.vertices]
                     pygame.draw.polygon(self.screen, color, vertices)
                 elif f.shape.type == 0: # Circles
-                    if isinstance(f.userData, tuple):
+                    sensor = self.world.contactListener.get_sensor(f.userData)
+                    if sensor is not None:
                         color = tuple( [max(0, int(c*0.84)) for c in main_color] )
-                        if self.world.contactListener.sensors[f.userData[0]][f.userData[1]] == True:
+                        if sensor:
                             color = (0, 185, 0, 255)
                     # TODO: replace with pygame.draw.ellipse()
                     pygame.draw.circle(self.screen, color,
@@ -168,6 +178,7 @@ class Camera(queryCallback):
         
         # Render Box2D World
         self.creatures_in_view.clear()
+        self.chain_drawn = False
         self.world.QueryAABB(self, self.aabb)
         for c in sorted(self.creatures_in_view, key=lambda c: c.id):
             self.draw_creature(c)
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+from collections import OrderedDict
+from math import inf
+import numpy as np
+from Box2D.b2 import world
+from nn import nnContactListener, BatchedNeuralNetwork
+import creatures
+from parameters import *
+
+
+TARGET_FPS = 60
+TIME_STEP = 1.0 / TARGET_FPS
+# Collision category 0 is left to the ground, and Animatronic.set_category
+# reuses the category as a (16 bits signed) group index
+MAX_BATCH = 14
+
+
+
+class PhysicsProfile:
+    """ How finely the world is simulated
+
+        Every step of a profile moves the world forward by `frames` times
+        TIME_STEP, in `substeps` Box2D steps solved with the given number
+        of velocity and position iterations.
+        Trial lengths, step counts and penalties are always expressed in
+        TIME_STEP steps, so the same creature is given the same time to
+        reach its target whatever the profile.
+    """
+
+    def __init__(self, frames=1, velocity_iterations=6, position_iterations=2, substeps=1):
+        self.frames = frames
+        self.time_step = frames * TIME_STEP
+        self.velocity_iterations = velocity_iterations
+        self.position_iterations = position_iterations
+        self.substeps = substeps
+
+    def step(self, w, speed=1.0):
+        """ Move a world forward by one step of the profile,
+            slowed down by a speed multiplier < 1
+        """
+        dt = self.time_step * speed / self.substeps
+        for _ in range(self.substeps):
+            w.Step(dt, self.velocity_iterations, self.position_iterations)
+
+
+PHYSICS = {"fast": PhysicsProfile(2, 4, 1),
+           "default": PhysicsProfile(),
+           "fine": PhysicsProfile(1, 8, 3, 2),
+           "precise": PhysicsProfile(1, 10, 4, 4)}
+
+
+
+class Evaluator:
+    """ Scores genomes on a given terrain
+
+        A genome is a (morpho, neural network) tuple, as returned by
+        Animatronic.get_genome.
+
+        Box2D's broadphase hands out proxies depending on which bodies were
+        created and destroyed before, so every trial is run in a new world
+        to keep scores independent from the trials that ran before it.
+
+        With pooled=True, the world is kept as long as the terrain doesn't
+        change and creatures' bodies are reused from one trial to the next
+        (see BodyPool). It saves building and destroying thousands of Box2D
+        objects per generation. Reused creatures are reset to their starting
+        state, but Box2D keeps internal state (broadphase proxies, contacts)
+        that a new world wouldn't have: pooled scores are approximate, they
+        can differ slightly from the ones of a new world, and from one run
+        to the next when batches are made of other creatures.
+
+        With settle_steps > 0, trials don't start with the creature dropped
+        from the starting position but with its body already lying on the
+        ground. For every morphology and terrain, a creature with stopped
+        motors is dropped once in its own world, until its body falls asleep
+        or for settle_steps steps at most, and the state of its body parts
+        is restored at the start of every trial.
+
+        With control_every > 1, creatures only read their sensors and feed
+        their neural network forward once every control_every physics
+        steps, motor speeds are held in between (action repeat).
+
+        physics is the name of the PhysicsProfile trials are simulated
+        with (see PHYSICS).
+
+        With record_every > 0, trials record the behaviour of creatures,
+        the position of their body every record_every steps (see Trial).
+    """
+
+    def __init__(self, pooled=False, settle_steps=0, control_every=1, physics="default",
+                 record_every=0):
+        self.contact_listener = nnContactListener()
+        self.pooled = pooled
+        self.pool = None
+        self.settle_steps = settle_steps
+        self.settled_terrain = None
+        self.settled_states = dict()
+        self.control_every = max(1, control_every)
+        self.physics = PHYSICS[physics]
+        self.record_every = record_every
+
+    def new_world(self, terrain):
+        if self.pooled:
+            if self.pool is None or not self.pool.terrain.is_same(terrain):
+                if self.pool is not None:
+                    self.pool.clear()
+                self.pool = BodyPool(self._new_world(terrain), terrain)
+            return self.pool.world
+        return self._new_world(terrain)
+
+    def _new_world(self, terrain):
+        w = world(contactListener=self.contact_listener,
+                  gravity=(0, -10),
+                  doSleep=True)
+        terrain.build(w)
+        return w
+
+    def build(self, morpho, w, terrain):
+        """ Build a creature's body at the starting position """
+        creature = getattr(creatures, morpho)(w)
+        creature.set_start_position(STARTPOS[0],
+                                    STARTPOS[1] + terrain.get_elevation(STARTPOS[0]))
+        creature.set_target(*TARGET)
+        creature.init_body()
+        return creature
+
+    def settled_state(self, morpho, terrain):
+        """ State of a creature's body parts once it has fallen on the ground,
+            as returned by Animatronic.save_state
+        """
+        if self.settled_terrain is None or not self.settled_terrain.is_same(terrain):
+            self.settled_terrain = terrain
+            self.settled_states.clear()
+        state = self.settled_states.get(morpho)
+        if state is None:
+            w = self._new_world(terrain)
+            creature = self.build(morpho, w, terrain)
+            for _ in range(0, self.settle_steps, self.physics.frames):
+                self.physics.step(w)
+                if not creature.body.awake:
+                    break
+            state = self.settled_states[morpho] = creature.save_state()
+            creature.destroy()
+        return state
+
+    def spawn(self, genome, w, terrain, slot=None):
+        """ Build the creature's body at the starting position,
+            or lying on the ground if settle_steps > 0
+
+            In pooled mode, a free creature of the same morphology and batch
+            slot is reset instead, if there is one
+        """
+        morpho, nn = genome
+        state = None
+        if self.settle_steps > 0:
+            state = self.settled_state(morpho, terrain)
+        creature = None
+        if self.pooled:
+            creature = self.pool.acquire(morpho, slot, state)
+        if creature is None:
+            creature = self.build(morpho, w, terrain)
+            if self.pooled:
+                self.pool.add(creature, slot)
+            if state is not None:
+                creature.set_state(state)
+        creature.nn = nn
+        return creature
+
+    def evaluate(self, genome, terrain, steps):
+        """ Run a single trial, returns the score (lower is better)
+
+            The trial ends after the given number of steps, or sooner if the
+            creature's body falls asleep.
+            Score is the distance to target at the end of the trial, plus
+            SLOUCHING_PENALTY for every step spent with the body on the ground.
+        """
+        return self.evaluate_batch([genome], terrain, steps)[0]
+
+    def evaluate_batch(self, genomes, terrain, steps):
+        """ Run the trials of several creatures at once, in the same world
+            Returns the list of scores, in the same order as genomes
+        """
+        return [trial.score for trial in self.run_trials(genomes, terrain, steps)]
+
+    def run_trials(self, genomes, terrain, steps, early_stop=(), cutoff=inf):
+        """ Run the trials of several creatures at once, in the same world
+
+            Creatures share the starting position but are given disjoint
+            collision categories, so they only collide with the ground.
+            Each one is scored as in Evaluator.evaluate.
+
+            Args:
+                early_stop: rules from earlystop.py, a trial is aborted as
+                            soon as one of them says so, and scored as if
+                            the creature stayed where it is with its body
+                            on the ground until the end
+                cutoff: score to beat to be selected, for earlystop.BoundRule
+
+            Returns the list of finished Trial objects, in the same order as
+            genomes
+        """
+        assert len(genomes) <= MAX_BATCH, f"Can't simulate more than {MAX_BATCH} creatures at once"
+        w = self.new_world(terrain)
+        trials = []
+        for i, genome in enumerate(genomes):
+            slot = i if len(genomes) > 1 else None
+            creature = self.spawn(genome, w, terrain, slot)
+            if slot is not None:
+                creature.set_category(slot+1)
+            trials.append(Trial(creature, self.pool if self.pooled else None))
+            if self.record_every > 0:
+                trials[-1].record(self.record_every, steps)
+
+        physics = self.physics
+        frames = physics.frames
+        penalty = SLOUCHING_PENALTY * frames
+        iterations = -(-steps // frames)
+        running = trials
+        group = CreatureGroup([trial.creature for trial in running])
+        for step in range(iterations):
+            if step % self.control_every == 0:
+                group.update(self.contact_listener.sensors)
+            physics.step(w)
+            still_running = []
+            for trial in running:
+                trial.steps += frames
+                if trial.behaviour is not None and trial.steps >= trial.next_sample:
+                    trial.sample()
+                if penalty != 0 and trial.creature.touching_ground():
+                    trial.score += penalty
+                if not trial.creature.body.awake:
+                    trial.finish()
+                elif any(rule.check(trial, steps, cutoff) for rule in early_stop):
+                    # Pessimistic completion: the creature would have spent
+                    # the rest of the trial on the ground
+                    trial.score += penalty * (iterations - step - 1)
+                    trial.aborted = True
+                    trial.finish()
+                else:
+                    still_running.append(trial)
+            if len(still_running) < len(running):
+                running = still_running
+                if not running:
+                    break
+                group = CreatureGroup([trial.creature for trial in running])
+        for trial in running:
+            trial.finish()
+        return trials
+
+
+
+class Trial:
+    """ A creature being evaluated """
+
+    def __init__(self, creature, pool=None):
+        self.creature = creature
+        self.pool = pool
+        self.score = 0
+        self.steps = 0
+        self.aborted = False
+        self.data = dict()  # Used by early stop rules
+        self.behaviour = None
+
+    def distance(self):
+        return (self.creature.target - self.creature.body.position).length
+
+    def record(self, every, limit_steps):
+        """ Record the behaviour of the creature: the position of its body
+            relative to where it started, every `every` steps, as a flat
+            array of limit_steps // every (x, y) pairs
+            Trials that end early hold their last position
+        """
+        self.every = every
+        self.next_sample = every
+        self.behaviour = np.zeros((limit_steps // every, 2))
+        self.samples = 0
+        self.start = tuple(self.creature.body.position)
+
+    def sample(self):
+        if self.samples < len(self.behaviour):
+            position = self.creature.body.position
+            self.behaviour[self.samples] = (position[0] - self.start[0],
+                                            position[1] - self.start[1])
+            self.samples += 1
+        self.next_sample += self.every
+
+    def finish(self):
+        """ Add the distance to target to the score and destroy the creature,
+            or give it back to its pool
+        """
+        self.score += self.distance()
+        if self.behaviour is not None:
+            while self.samples < len(self.behaviour):
+                self.sample()
+            self.behaviour = self.behaviour.ravel()
+        if self.pool is not None:
+            self.pool.release(self.creature)
+        else:
+            self.creature.destroy()
+        self.creature = None
+
+
+
+class BodyPool:
+    """ Creatures built once in a world and reused from one trial to the next
+
+        Free creatures are kept out of the simulation (inactive bodies) and
+        reset to their starting state when acquired again.
+        They are sorted by morphology and batch slot, as a creature keeps the
+        collision category of the slot it was first used in.
+    """
+
+    def __init__(self, world, terrain):
+        self.world = world
+        self.terrain = terrain
+        self.creatures = []
+        self.free = dict()
+        self.slots = dict()
+        self.start_states = dict()
+
+    def add(self, creature, slot=None):
+        """ Register a newly built creature, in use """
+        self.creatures.append(creature)
+        self.slots[creature.id] = slot
+        self.start_states[creature.id] = creature.save_state()
+
+    def acquire(self, morpho, slot=None, state=None):
+        """ Returns a free creature reset to its starting state, or to the
+            given state, or None if there is no free creature
+        """
+        free = self.free.get((morpho, slot))
+        if not free:
+            return None
+        creature = free.pop()
+        creature.reset(state or self.start_states[creature.id])
+        return creature
+
+    def release(self, creature):
+        creature.deactivate()
+        self.free.setdefault((creature.morpho, self.slots[creature.id]), []).append(creature)
+
+    def clear(self):
+        """ Forget every creature, before the world is dropped """
+        for creature in self.creatures:
+            self.world.contactListener.unregisterSensors(creature.sensor_row)
+        self.creatures = []
+        self.free.clear()
+
+
+
+class CreatureGroup:
+    """
+        Creatures updated together, their neural networks are fed forward
+        all at once when they share the same architecture, and their
+        sensors and motors are handled all at once when they also share
+        the same morphology
+    """
+    
+    def __init__(self, creatures):
+        self.creatures = list(creatures)
+        networks = [c.nn for c in self.creatures]
+        self.nn = None
+        self.definitions = None
+        if len(networks) > 1 and BatchedNeuralNetwork.is_compatible(networks):
+            self.nn = BatchedNeuralNetwork(networks, [c.definitions.mirror for c in self.creatures])
+            if len(set([c.morpho for c in self.creatures])) == 1:
+                self.definitions = self.creatures[0].definitions
+                self.rows = [c.sensor_row for c in self.creatures]
+                self.n_contact_sensors = self.creatures[0].n_contact_sensors
+    
+    def update(self, sensors, mirror=False):
+        """
+            Args:
+                sensors: contact sensors of every creature, one row each
+                         (nnContactListener.sensors)
+                mirror: inverse the symmetry of receptors
+        """
+        if self.nn is None:
+            for c in self.creatures:
+                c.update(sensors[c.sensor_row, :c.n_contact_sensors], mirror)
+            return
+        
+        inputs = self.nn.inputs[0][:, 0, :-1]
+        if self.definitions is None:
+            inputs[:] = [c.read_sensors(sensors[c.sensor_row, :c.n_contact_sensors], mirror)
+                         for c in self.creatures]
+            self.nn.feedforward(mirrored=[c.mirrored for c in self.creatures])
+            for c, output in zip(self.creatures, self.nn.output):
+                c.actuate(output)
+            return
+        
+        contacts = sensors[self.rows, :self.n_contact_sensors].tolist()
+        inputs[:] = [c.sense(s, mirror) for c, s in zip(self.creatures, contacts)]
+        modes = [int(c.mirrored) for c in self.creatures]
+        self.definitions.network_inputs(inputs)
+        self.nn.feedforward(mirrored=modes)
+        speeds = self.definitions.motor_speeds_batch(self.nn.output, modes)
+        for c, row in zip(self.creatures, speeds.tolist()):
+            for joint, speed in zip(c.joints, row):
+                joint.motorSpeed = speed
+
+
+
+
+def genome_digest(genome):
+    """ Hash of a genome's morphology, activation function and weights """
+    morpho, nn = genome
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{morpho} {nn.activation} {nn.get_layers()}".encode())
+    for w in nn.weights:
+        h.update(w.tobytes())
+    return h.digest()
+
+
+
+class FitnessCache:
+    """ Scores of already evaluated genomes, with a bounded size
+        (least recently used scores are forgotten first)
+    """
+    
+    def __init__(self, size=4096, options=None):
+        """
+            Args:
+                options: Evaluator arguments the scores are obtained with
+        """
+        self.size = size
+        self.options = tuple(sorted((options or {}).items()))
+        self.scores = OrderedDict()
+        self.reset_counters()
+    
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+    
+    def get_key(self, genome, terrain, steps):
+        return (genome_digest(genome), genome[0], terrain.seed, terrain.roughness,
+                terrain.x0, len(terrain.elevations), steps, self.options)
+    
+    def get(self, key):
+        """ Returns the score stored for this key, or None """
+        score = self.scores.get(key)
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.scores.move_to_end(key)
+        return score
+    
+    def put(self, key, score):
+        if self.size <= 0:
+            return
+        self.scores[key] = score
+        self.scores.move_to_end(key)
+        while len(self.scores) > self.size:
+            self.scores.popitem(last=False)
+
+
+
+# Evaluators of this process, by options, created on first use
+_evaluators = dict()
+
+
+def get_evaluator(**options):
+    """ Returns this process' evaluator with the given options
+        (see Evaluator's arguments)
+    """
+    key = tuple(sorted(options.items()))
+    evaluator = _evaluators.get(key)
+    if evaluator is None:
+        evaluator = _evaluators[key] = Evaluator(**options)
+    return evaluator
+
+
+def evaluate(genome, terrain, steps, **options):
+    """ Score a genome on a terrain for a given number of steps """
+    return get_evaluator(**options).evaluate(genome, terrain, steps)
+
+
+def evaluate_batch(genomes, terrain, steps, **options):
+    """ Score up to MAX_BATCH genomes simulated together in the same world """
+    return get_evaluator(**options).evaluate_batch(genomes, terrain, steps)
+
+
+def run_trials(genomes, terrain, steps, early_stop=(), cutoff=inf, **options):
+    """ Same as evaluate_batch, returns the finished Trial objects """
+    return get_evaluator(**options).run_trials(genomes, terrain, steps, early_stop, cutoff)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+# userData of the ground fixtures (see nn.nnContactListener)
+GROUND_TAG = -1
+
+
+
+class Terrain:
+    """ Ground profile, with one elevation point every meter
+        Only holds plain values so it can be sent to other processes
+    """
+
+    def __init__(self, elevations, x0=-50, seed=None, roughness=None):
+        self.elevations = np.asarray(elevations, dtype=float)
+        self.x0 = x0
+        self.seed = seed
+        self.roughness = roughness
+        # Ground vertices, ready to be handed to Box2D
+        xs = np.arange(x0, x0+len(self.elevations))
+        self.vertices = np.column_stack((xs, self.elevations)).tolist()
+
+    def is_same(self, other):
+        """ True if both terrains have the same ground profile """
+        return (other is self
+                or (other.x0 == self.x0 and np.array_equal(other.elevations, self.elevations)))
+
+    def get_elevation(self, x):
+        return self.elevations[round(x) - self.x0]
+
+    def build(self, world, chain=True):
+        """ Create a static body holding the ground shape in a Box2D world
+
+            The ground is a single chain shape, or one edge shape per meter
+            if chain is False
+        """
+        ground = world.CreateStaticBody()
+        if chain:
+            ground.CreateChainFixture(vertices_chain=self.vertices,
+                                      friction=1.0,
+                                      userData=GROUND_TAG)
+        else:
+            for v1, v2 in zip(self.vertices[:-1], self.vertices[1:]):
+                ground.CreateEdgeFixture(vertices=[v1, v2],
+                                         friction=1.0,
+                                         userData=GROUND_TAG)
+        return ground
+
+
+
+def random_terrain(roughness, seed=None, x0=-50, length=100):
+    """
+        Args:
+            roughness: terrain variation in elevation (in percent)
+            seed: the same seed and roughness always give the same terrain
+            x0: leftmost point of the ground
+            length: width of the ground (in meters)
+    """
+    rng = np.random.default_rng(seed)
+    slopes = (rng.random(length)-0.5) * roughness*0.01
+    elevations = np.concatenate(([0.0], np.cumsum(slopes)))
+    return Terrain(elevations, x0, seed, roughness)
+
+
+
+class TerrainCache:
+    """ A fixed set of terrains, generated once and picked from
+        at every generation
+    """
+
+    def __init__(self, roughness, size, seed=None, **kwargs):
+        """
+            Args:
+                roughness: terrain variation in elevation (in percent)
+                size: number of different terrains
+                seed: seed of the whole set of terrains
+                kwargs: passed to random_terrain
+        """
+        rng = np.random.default_rng(seed)
+        self.terrains = [random_terrain(roughness, int(s), **kwargs)
+                         for s in rng.integers(2**32, size=size)]
+
+    def choice(self, rng):
+        """ Pick a terrain with a random.Random or numpy Generator """
+        return self.terrains[int(rng.random() * len(self.terrains))]